@@ -0,0 +1,141 @@
+"""Assignment 2 - Blocky
+
+=== CSC148 Fall 2017 ===
+Diane Horton and David Liu
+Department of Computer Science,
+University of Toronto
+
+
+=== Module Description ===
+
+This file contains the Bitboard class, a view of a board that stores the
+unit cells of each colour as the bits of one int.
+
+The unit cell at column x and row y of the board is bit x * (size + 1) + y.
+Each column has one spare bit after its last row, which is never set, so
+that shifting a set of cells by one bit moves each cell one row up or down
+without wrapping into the next column, and shifting by size + 1 bits moves
+each cell one column left or right.  Scoring a goal on a Bitboard then
+takes a few operations on big ints instead of a look at every unit cell.
+"""
+from typing import List, Tuple
+from renderer import COLOUR_LIST
+
+
+class Bitboard:
+    """The unit cells of a board, as one set of bits for each colour.
+
+    === Public Attributes ===
+    size:
+        The number of unit cells along each side of the board.
+    colours:
+        The set of unit cells of each colour, in the same order as
+        COLOUR_LIST, with the layout described above.
+
+    === Representation Invariants ===
+    - size is a power of 2
+    - len(colours) == len(COLOUR_LIST)
+    - no unit cell is in more than one of colours
+    - the spare bit at the end of each column is not set in any of colours
+    """
+    size: int
+    colours: List[int]
+
+    def __init__(self, board: 'Block') -> None:
+        """Initialize this Bitboard with the unit cells of <board>.
+
+        <board> may be a Block or a LinearBlock.
+        """
+        self.size = 2 ** (board.max_depth - board.level)
+        self.colours = [0] * len(COLOUR_LIST)
+        stride = self.size + 1
+
+        # Fill in the square of each undivided block at once.  A square of
+        # width cells is one column of bits, repeated every stride bits.
+        squares = {}
+        stack = [(board, 0, 0, self.size)]
+        while stack:
+            block, x, y, cells = stack.pop()
+            children = block.children
+            if len(children) == 0:
+                if cells not in squares:
+                    column = (1 << cells) - 1
+                    squares[cells] = column * (
+                        ((1 << (stride * cells)) - 1) // ((1 << stride) - 1))
+                index = COLOUR_LIST.index(block.colour)
+                self.colours[index] |= squares[cells] << (x * stride + y)
+            else:
+                half = cells // 2
+                positions = [(x + half, y), (x, y), (x, y + half),
+                             (x + half, y + half)]
+                for child, (child_x, child_y) in zip(children, positions):
+                    stack.append((child, child_x, child_y, half))
+
+    def cells(self, colour: Tuple[int, int, int]) -> int:
+        """Return the set of unit cells of colour <colour>, or 0 if
+        <colour> is not in COLOUR_LIST.
+        """
+        if colour not in COLOUR_LIST:
+            return 0
+        return self.colours[COLOUR_LIST.index(colour)]
+
+    def area(self, colour: Tuple[int, int, int]) -> int:
+        """Return the number of unit cells of colour <colour>.
+        """
+        return _popcount(self.cells(colour))
+
+    def perimeter(self, colour: Tuple[int, int, int]) -> int:
+        """Return the number of unit cells of colour <colour> on the
+        perimeter of the board, counting corner cells twice.
+
+        This is the score of a PerimeterGoal for <colour>.
+        """
+        stride = self.size + 1
+        last = stride * (self.size - 1)
+        column = (1 << self.size) - 1
+        row = ((1 << (stride * self.size)) - 1) // ((1 << stride) - 1)
+        bits = self.cells(colour)
+        return (_popcount(bits & column) + _popcount(bits & (column << last)) +
+                _popcount(bits & row) +
+                _popcount(bits & (row << (self.size - 1))))
+
+    def largest_blob(self, colour: Tuple[int, int, int]) -> int:
+        """Return the number of unit cells in the largest blob of colour
+        <colour>.
+
+        This is the score of a BlobGoal for <colour>.  Each blob is grown
+        from one of its cells by adding the neighbours of its cells that
+        have colour <colour>, until it stops growing.
+        """
+        stride = self.size + 1
+        bits = self.cells(colour)
+        remaining = bits
+        best = 0
+        # Stop once the cells left could not make a larger blob
+        while _popcount(remaining) > best:
+            blob = remaining & -remaining
+            while True:
+                grown = (blob | (blob << 1) | (blob >> 1) |
+                         (blob << stride) | (blob >> stride)) & bits
+                if grown == blob:
+                    break
+                blob = grown
+            remaining &= ~blob
+            best = max(best, _popcount(blob))
+        return best
+
+
+def _popcount(bits: int) -> int:
+    """Return the number of set bits in the non-negative int <bits>.
+    """
+    return bin(bits).count('1')
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', 'renderer'
+        ],
+        'max-attributes': 15
+    })
@@ -10,15 +10,52 @@ University of Toronto
 
 This file contains the Block class, the main data structure used in the game.
 """
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Dict, Union, Iterable
 import random
 import math
+import weakref
+try:
+    import numpy as np
+except ImportError:
+    np = None
 from renderer import COLOUR_LIST, TEMPTING_TURQUOISE, BLACK, colour_name
 
 
 HIGHLIGHT_COLOUR = TEMPTING_TURQUOISE
 FRAME_COLOUR = BLACK
 
+# The index in Block.children of the child in each quadrant, where quadrant
+# (column << 1) | row has column 1 for the right half and row 1 for the
+# lower half.
+_QUADRANT_INDEX = (1, 2, 0, 3)
+
+# The index in Block.children of the child that moves to each index when a
+# Block is reflected left to right
+_MIRROR_INDEX = (1, 0, 3, 2)
+
+
+class _NoChildren(list):
+    """The empty list of children shared by every undivided Block.
+
+    It cannot be changed, since a change would apply to every undivided
+    Block at once.  A Block is subdivided by assigning to its children
+    instead.
+    """
+    __slots__ = ()
+
+    def _refuse(self, *args, **kwargs) -> None:
+        """Raise TypeError, since this list cannot be changed.
+        """
+        raise TypeError('an undivided Block has no children to change; '
+                        'assign a list to its children instead')
+
+    append = extend = insert = remove = pop = clear = sort = reverse = \
+        __setitem__ = __delitem__ = __iadd__ = __imul__ = _refuse
+
+
+# The _children of every undivided Block
+_NO_CHILDREN = _NoChildren()
+
 
 class Block:
     """A square block in the Blocky game.
@@ -27,9 +64,11 @@ class Block:
     position:
         The (x, y) coordinates of the upper left corner of this Block.
         Note that (0, 0) is the top left corner of the window.
+        This is computed from the position of the parent when needed.
     size:
         The height and width of this Block.  Since all blocks are square,
         we needn't represent height and width separately.
+        This is computed from the size of the parent when needed.
     colour:
         If this block is not subdivided, <colour> stores its colour.
         Otherwise, <colour> is None and this block's sublocks store their
@@ -46,9 +85,80 @@ class Block:
     children:
         The blocks into which this block is subdivided.  The children are
         stored in this order: upper-right child, upper-left child,
-        lower-left child, lower-right child.
+        lower-left child, lower-right child.  Reading this attribute
+        applies any pending rotation to them first.  The empty children of
+        an undivided block cannot be changed in place; assign a new list
+        to subdivide it.
     parent:
-        The block that this block is directly within.
+        The block that this block is directly within.  Only a weak
+        reference to it is kept, so a Block does not keep its parent alive.
+
+    === Private Attributes ===
+    _colour:
+        The index into the colour palette of the colour of this Block, or
+        None if it is subdivided.
+    _parent:
+        A weak reference to the parent of this Block, or None if it has no
+        parent.
+    _children:
+        The sub blocks of this Block, in the order they were in before the
+        pending rotation <_orientation> was recorded.  Undivided Blocks all
+        share the unchangeable empty list _NO_CHILDREN, rather than each
+        having a list of their own.
+    _orientation:
+        The number of clockwise quarter turns that this Block has been
+        rotated by but that have not yet been applied to <_children>.
+        Rotating a Block only updates this number; the rotation is pushed
+        down one level at a time as the children are looked at.
+    _position:
+        The position of this Block, as of layout epoch <_located>.
+    _size:
+        The size of this Block, as of layout epoch <_located>.
+    _located:
+        The layout epoch at which <_position> and <_size> were computed.
+    _flat:
+        The result of the last call to flatten on this Block, or None if
+        this Block has been changed since then (that is, it is dirty).
+    _flat_array:
+        The result of the last call to flatten_array on this Block, or None
+        if this Block has been changed since then.
+    _hashes:
+        The structural hashes of the eight symmetries of this Block, or
+        None if this Block has been changed since they were computed.  The
+        first four are the hashes of this Block rotated clockwise by zero,
+        one, two and three quarter turns, and the last four are the hashes
+        of its mirror image rotated in the same way.
+    _areas:
+        The number of unit cells of each colour of COLOUR_LIST within this
+        Block, in the same order, or None if they have not been counted.
+        Swaps and rotations do not change them.  When a smash replaces the
+        contents of a Block, the counts of its ancestors are adjusted by
+        the difference.
+    _rectangles:
+        The colour and frame rectangles of the undivided blocks within this
+        Block, as last computed, or None if this Block has been changed
+        since then.  The highlight frame is not included.
+    _rectangles_at:
+        The position and size this Block had when <_rectangles> was
+        computed.
+    _highlighted:
+        True iff the user has selected this block for action.
+    _journal:
+        The record of the moves made on the board that this Block is the
+        root of, or None if no moves have been made on it.
+
+    === Class Attributes ===
+    flatten_hits:
+        The number of calls to flatten answered from a cached result.
+    flatten_misses:
+        The number of calls to flatten that had to build a result.
+    _epoch:
+        The current layout epoch.  It is advanced whenever a move changes
+        where blocks are, which makes every cached position out of date.
+    _highlighted_blocks:
+        The blocks whose highlighted attribute is True.  They are tracked
+        apart from the cached rectangles, so that moving the selection does
+        not make those out of date.
 
     === Representation Invariations ===
     - len(children) == 0 or len(children) == 4
@@ -62,15 +172,40 @@ class Block:
     - If this Block has no children,
         - its colour is not None
     - level <= max_depth
+    - 0 <= _orientation < 4, and _orientation == 0 if this Block has no
+      children
+    - If _areas is not None, neither is the _areas of any descendant
     """
-    position: Tuple[int, int]
-    size: int
-    colour: Optional[Tuple[int, int, int]]
+    # Blocks are created in great numbers, so they store their attributes
+    # in slots rather than a __dict__.
+    __slots__ = ('_position', '_size', '_located', '_colour', 'level',
+                 'max_depth', '_highlighted', '_children', '_orientation',
+                 '_parent', '_flat', '_flat_array', '_hashes', '_areas',
+                 '_rectangles', '_rectangles_at', '_journal', '__weakref__')
+
+    flatten_hits = 0
+    flatten_misses = 0
+    _epoch = 0
+    _highlighted_blocks = weakref.WeakSet()
+
     level: int
     max_depth: int
-    highlighted: bool
-    children: List['Block']
-    parent: Optional['Block']
+    _colour: Optional[int]
+    _parent: Optional['weakref.ref']
+    _children: List['Block']
+    _orientation: int
+    _position: Tuple[int, int]
+    _size: int
+    _located: int
+    _flat: Optional[List[List[Tuple[int, int, int]]]]
+    _flat_array: Optional['np.ndarray']
+    _hashes: Optional[Tuple[int, ...]]
+    _areas: Optional[Tuple[int, ...]]
+    _rectangles: Optional[List[Tuple[Tuple[int, int, int], Tuple[int, int],
+                                     Tuple[int, int], int]]]
+    _rectangles_at: Tuple[Tuple[int, int], int]
+    _highlighted: bool
+    _journal: Optional['MoveJournal']
 
     def __init__(self, level: int,
                  colour: Optional[Tuple[int, int, int]] = None,
@@ -79,19 +214,179 @@ class Block:
         no parent.
 
         If <children> is None, give this block no children.  Otherwise
-        give it the provided children.  Use the provided level and colour,
-        and set everything else (x and y coordinates, size,
-        and max_depth) to 0.  (All attributes can be updated later, as
-        appropriate.)
-        """
-        self.position = (0, 0)
-        self.size = 0
-        self.colour = colour
+        give it the provided children, and make this block their parent.
+        Use the provided level and colour, and set everything else (x and y
+        coordinates, size, and max_depth) to 0.  (All attributes can be
+        updated later, as appropriate.)
+        """
+        self._position = (0, 0)
+        self._size = 0
+        self._located = -1
+        self._colour = None if colour is None else _palette_index(colour)
         self.level = level
         self.max_depth = 0
-        self.highlighted = False
-        self.children = [] if children is None else children
-        self.parent = None
+        self._highlighted = False
+        self._children = children if children else _NO_CHILDREN
+        self._orientation = 0
+        self._parent = None
+        self._flat = None
+        self._flat_array = None
+        self._hashes = None
+        self._areas = None
+        self._rectangles = None
+        self._rectangles_at = ((0, 0), 0)
+        self._journal = None
+        for child in self._children:
+            child.parent = self
+
+    @property
+    def colour(self) -> Optional[Tuple[int, int, int]]:
+        """The colour of this Block, or None if it is subdivided.
+        """
+        if self._colour is None:
+            return None
+        return _PALETTE[self._colour]
+
+    @colour.setter
+    def colour(self, colour: Optional[Tuple[int, int, int]]) -> None:
+        if colour is None:
+            self._colour = None
+        else:
+            self._colour = _palette_index(colour)
+        self._invalidate()
+        self._clear_areas()
+        Block._epoch += 1
+
+    @property
+    def parent(self) -> Optional['Block']:
+        """The block that this block is directly within, or None.
+        """
+        if self._parent is None:
+            return None
+        return self._parent()
+
+    @parent.setter
+    def parent(self, parent: Optional['Block']) -> None:
+        # Weak references without callbacks are shared, so the four children
+        # of a Block hold the same reference object.
+        self._parent = None if parent is None else weakref.ref(parent)
+
+    @property
+    def children(self) -> List['Block']:
+        """The sub blocks of this Block, in the order described above.
+        """
+        # Locating this Block applies the pending rotations of its ancestors
+        self._locate()
+        if self._orientation:
+            self._apply_orientation()
+        return self._children
+
+    @children.setter
+    def children(self, children: List['Block']) -> None:
+        self._children = children
+        self._orientation = 0
+        for child in children:
+            child.parent = self
+        self._invalidate()
+        self._clear_areas()
+        Block._epoch += 1
+
+    def _apply_orientation(self) -> None:
+        """Apply the pending rotation of this Block to the order of its
+        children, and pass the rotation on to each of them.
+
+        The cached flattened representations and hashes of the children are
+        rotated to match, so they stay valid.
+        """
+        turns = self._orientation
+        self._orientation = 0
+        self._children = self._children[turns:] + self._children[:turns]
+        for child in self._children:
+            if child._children:
+                child._orientation = (child._orientation + turns) % 4
+                if child._flat is not None:
+                    child._flat = _rotate_grid(child._flat, turns)
+                if child._flat_array is not None:
+                    child._flat_array = np.rot90(child._flat_array, turns)
+                if child._hashes is not None:
+                    child._hashes = _rotate_hashes(child._hashes, turns)
+                child._rectangles = None
+
+    @property
+    def highlighted(self) -> bool:
+        """True iff the user has selected this block for action.
+        """
+        return self._highlighted
+
+    @highlighted.setter
+    def highlighted(self, highlighted: bool) -> None:
+        self._highlighted = highlighted
+        if highlighted:
+            Block._highlighted_blocks.add(self)
+        else:
+            Block._highlighted_blocks.discard(self)
+
+    @property
+    def position(self) -> Tuple[int, int]:
+        """The (x, y) coordinates of the upper left corner of this Block.
+        """
+        self._locate()
+        return self._position
+
+    @property
+    def size(self) -> int:
+        """The height and width of this Block.
+        """
+        self._locate()
+        return self._size
+
+    def _locate(self) -> None:
+        """Bring the position and size of this Block up to date, computing
+        them from those of its parent if they have changed since they were
+        last computed.
+
+        The position and size of a Block with no parent are those last given
+        to update_block_locations.
+
+        Since every move advances the layout epoch, a Block whose location
+        is up to date has no ancestors with pending rotations.  Otherwise,
+        locating it applies those rotations, from the top down.
+        """
+        if self._located == Block._epoch or self.parent is None:
+            return
+        parent = self.parent
+        parent._locate()
+        x, y = parent._position
+        size = round(parent._size / 2)
+        positions = [(x + size, y),
+                     (x, y),
+                     (x, y + size),
+                     (x + size, y + size)]
+        self._position = positions[parent.children.index(self)]
+        self._size = size
+        self._located = Block._epoch
+
+    def _invalidate(self) -> None:
+        """Mark this Block and all of its ancestors as dirty, so that their
+        flattened representations, hashes and rectangles are rebuilt when
+        next needed.
+        """
+        block = self
+        while block is not None:
+            block._flat = None
+            block._flat_array = None
+            block._hashes = None
+            block._rectangles = None
+            block = block.parent
+
+    def _clear_areas(self) -> None:
+        """Forget the colour counts of this Block and all of its ancestors,
+        so that they are counted again when next needed.
+        """
+        block = self
+        while block is not None:
+            block._areas = None
+            block = block.parent
 
     def rectangles_to_draw(self) -> List[Tuple[Tuple[int, int, int],
                                                Tuple[int, int],
@@ -122,25 +417,57 @@ class Block:
           the outline.
 
         The order of the rectangles does not matter.
+
+        Each Block caches the colour and frame rectangles of its sub blocks,
+        so only the parts of the tree changed by a move since the last call
+        are visited again.  Highlight frames are added separately.
         """
-        rectangles = []
+        rectangles = list(self._geometry())
+
+        # Add the highlight frames of this block and its highlighted
+        # descendants
+        for block in list(Block._highlighted_blocks):
+            ancestor = block
+            while ancestor is not None and ancestor is not self:
+                ancestor = ancestor.parent
+            if ancestor is self:
+                rectangles.append((HIGHLIGHT_COLOUR, block.position,
+                                   (block.size, block.size), 5))
+        return rectangles
+
+    def _geometry(self) -> List[Tuple[Tuple[int, int, int], Tuple[int, int],
+                                      Tuple[int, int], int]]:
+        """Return the colour and frame rectangles of the undivided blocks
+        within this Block, using the cached list when it is still valid.
 
-        # Add the highlight frame if highlighted
-        if self.highlighted:
-            rectangles.append((HIGHLIGHT_COLOUR, self.position,
-                               (self.size, self.size), 5))
+        A cached list for a Block that has only moved since it was built is
+        shifted to the new position rather than rebuilt.
+        """
+        position = self.position
+        size = self._size
+        old_position, old_size = self._rectangles_at
+        if self._rectangles is not None and old_size == size:
+            if old_position != position:
+                dx = position[0] - old_position[0]
+                dy = position[1] - old_position[1]
+                self._rectangles = [(colour, (x + dx, y + dy), dims, width)
+                                    for colour, (x, y), dims, width
+                                    in self._rectangles]
+                self._rectangles_at = (position, size)
+            return self._rectangles
 
         # Add the colour rectangle and frame if the block is coloured
-        if self.colour:
-            rectangles.append((self.colour, self.position,
-                               (self.size, self.size), 0))
-            rectangles.append((FRAME_COLOUR, self.position,
-                               (self.size, self.size), 3))
+        if self._colour is not None:
+            rectangles = [(self.colour, position, (size, size), 0),
+                          (FRAME_COLOUR, position, (size, size), 3)]
 
         # Otherwise add rectangles for each of the sub blocks
         else:
+            rectangles = []
             for child in self.children:
-                rectangles.extend(child.rectangles_to_draw())
+                rectangles.extend(child._geometry())
+        self._rectangles = rectangles
+        self._rectangles_at = (position, size)
         return rectangles
 
     def swap(self, direction: int) -> None:
@@ -149,49 +476,60 @@ class Block:
         If <direction> is 1, swap vertically.  If <direction> is 0, swap
         horizontally. If this Block has no children, do nothing.
         """
+        if self._swap(direction):
+            self._record('swap', direction)
+
+    def _swap(self, direction: int) -> bool:
+        """Swap the child Blocks of this Block as described in swap,
+        without recording the move.
+
+        Return True iff this Block has children.
+        """
+        children = self.children
+        if len(children) == 0:
+            return False
+
         # If the swap is vertical, simply reverse the children
-        self.children.reverse()
+        children.reverse()
 
         # If the swap is horizontal, take the reversed children and switch
         # the first two child blocks with the last two.
         if direction == 0:
-            self.children = self.children[2:4] + self.children[:2]
+            self._children = children[2:4] + children[:2]
 
-        # Update sub block locations
-        self.update_block_locations(self.position, self.size)
+        # Mark sub block locations and flattened representations as out
+        # of date
+        self._invalidate()
+        Block._epoch += 1
+        return True
 
     def rotate(self, direction: int) -> None:
         """Rotate this Block and all its descendants.
 
         If <direction> is 1, rotate clockwise.  If <direction> is 3, rotate
         counterclockwise. If this Block has no children, do nothing.
-        """
-        self._rotate_helper(direction)
-        self.update_block_locations(self.position, self.size)
-
-    def _rotate_helper(self, direction: int) -> None:
-        """Recursive helper function to rotate this block and its descendants.
 
-        By using a helper function we can avoid calling update_block_locations
-        inside another recursive function, and instead call it after this
-        function has updated the block structure.
-
-        If <direction> is 1, rotate clockwise.  If <direction> is 3, rotate
-        counterclockwise. If this Block has no children, do nothing.
+        The rotation is only recorded here, in constant time, and is applied
+        to the descendants as they are next looked at.
         """
-        # In the base case where there are no child blocks, do nothing
-        if len(self.children) == 0:
+        if len(self._children) == 0 or direction not in (1, 3):
             return
+        self._rotate(direction)
+        self._record('rotate', direction)
 
-        # In the recursive case rotate the child blocks and recursively
-        # rotate the child blocks of the child blocks.
-        else:
-            if direction == 1:
-                self.children.append(self.children.pop(0))
-            elif direction == 3:
-                self.children.insert(0, self.children.pop())
-            for child in self.children:
-                child._rotate_helper(direction)
+    def _rotate(self, direction: int) -> None:
+        """Rotate this Block, which has children, clockwise by <direction>
+        quarter turns without recording the move.
+        """
+        self._orientation = (self._orientation + direction) % 4
+
+        # This Block's hashes include those of its rotations, so they only
+        # need to be reordered.
+        hashes = self._hashes
+        self._invalidate()
+        if hashes is not None:
+            self._hashes = _rotate_hashes(hashes, direction)
+        Block._epoch += 1
 
     def smash(self) -> bool:
         """Smash this block.
@@ -208,26 +546,136 @@ class Block:
         """
         # If the current block is not a unit or a root block.
         if 0 < self.level < self.max_depth:
-
-            # If the block has no children add some
-            if len(self.children) == 0:
-                self.colour = None
-                for _ in range(4):
-                    self.children.append(random_init(self.level + 1,
-                                                     self.max_depth))
-                
-            # If the block does have children modify them
-            else:
-                for i in range(4):
-                    self.children[i] = random_init(self.level + 1,
-                                                   self.max_depth)
-
-            self.update_block_locations(self.position, self.size)
+            # Replace the colour or children of this block with four new
+            # random children.  The old ones are kept in the journal entry,
+            # so the smash can be undone.
+            contents = [[random_init(self.level + 1, self.max_depth)
+                         for _ in range(4)], 0, None]
+            self._exchange_contents(contents)
+            self._record('smash', contents)
             return True
 
         # If the current block is not valid for smashing, return False.
         return False
 
+    def _exchange_contents(self, contents: list) -> None:
+        """Replace the children, orientation and colour index of this Block
+        with the three items of <contents>, and put the old ones into
+        <contents> in their place.
+        """
+        # Apply any pending rotations from the ancestors of this block
+        # before its children are replaced.
+        self._locate()
+        for child in self._children:
+            child.parent = None
+        old_contents = [self._children, self._orientation, self._colour]
+        self._children, self._orientation, self._colour = contents
+        contents[:] = old_contents
+        for child in self._children:
+            child.parent = self
+        self._invalidate()
+
+        # Only the colour counts of the ancestors change, by the difference
+        # between the old and new contents.  If this Block's were never
+        # counted, neither were any of its ancestors'.
+        old_areas = self._areas
+        self._areas = None
+        if old_areas is not None:
+            new_areas = self._compute_areas()
+            block = self.parent
+            while block is not None:
+                block._areas = tuple(
+                    area + new - old for area, new, old
+                    in zip(block._areas, new_areas, old_areas))
+                block = block.parent
+        Block._epoch += 1
+
+    def _record(self, action: str, data: object) -> None:
+        """Record that <action> was applied to this Block with <data>, in
+        the journal of the board this Block belongs to.
+        """
+        root = self._root()
+        if root._journal is None:
+            root._journal = MoveJournal()
+        root._journal.record((self, action, data))
+
+    def _root(self) -> 'Block':
+        """Return the root of the board that this Block belongs to.
+        """
+        root = self
+        while root.parent is not None:
+            root = root.parent
+        return root
+
+    def undo(self) -> bool:
+        """Undo the most recent move made on the board that this Block
+        belongs to, and that has not already been undone.
+
+        Return True if a move was undone and False if there was none.
+        """
+        journal = self._root()._journal
+        if journal is None or not journal.done:
+            return False
+        move = journal.done.pop()
+        block, action, data = move
+        if action == 'swap':
+            block._swap(data)
+        elif action == 'rotate':
+            block._rotate(4 - data)
+        else:
+            block._exchange_contents(data)
+        journal.undone.append(move)
+        return True
+
+    def redo(self) -> bool:
+        """Make again the move most recently undone on the board that this
+        Block belongs to, as long as no other move has been made since.
+
+        Return True if a move was made and False if there was none.
+        """
+        journal = self._root()._journal
+        if journal is None or not journal.undone:
+            return False
+        move = journal.undone.pop()
+        block, action, data = move
+        if action == 'swap':
+            block._swap(data)
+        elif action == 'rotate':
+            block._rotate(data)
+        else:
+            block._exchange_contents(data)
+        journal.done.append(move)
+        return True
+
+    def checkpoint(self) -> int:
+        """Return a checkpoint for the current state of the board that this
+        Block belongs to, which can be passed to rollback.
+        """
+        journal = self._root()._journal
+        if journal is None:
+            return 0
+        return len(journal.done)
+
+    def rollback(self, checkpoint: int) -> None:
+        """Undo every move made on the board that this Block belongs to
+        since <checkpoint> was returned by checkpoint.
+
+        The moves can be made again using redo.
+        """
+        while self.checkpoint() > checkpoint:
+            self.undo()
+
+    def clear_history(self) -> None:
+        """Forget the moves made and undone so far on the board that this
+        Block belongs to, so that they can no longer be undone or redone,
+        and free the blocks that only the journal was keeping.
+
+        Checkpoints taken before this no longer undo anything.
+        """
+        journal = self._root()._journal
+        if journal is not None:
+            journal.clear()
+
     def update_block_locations(self, top_left: Tuple[int, int],
                                size: int) -> None:
         """
@@ -238,22 +686,16 @@ class Block:
 
         <top_left> is the (x, y) coordinates of the top left corner of
         this Block.  <size> is the height and width of this Block.
-        """
-        # Set the current block's attributes
-        self.position = top_left
-        self.size = size
-
-        # Create new positions for the child blocks
-        x, y = top_left[0], top_left[1]
-        new_size = round(size / 2)
-        positions = [(x + new_size, y),
-                     (x, y),
-                     (x, y + new_size),
-                     (x + new_size, y + new_size)]
 
-        # Update the positions of the child blocks with the new positions
-        for i in range(len(self.children)):
-            self.children[i].update_block_locations(positions[i], new_size)
+        The sub blocks are not visited here; their positions and sizes are
+        computed from this Block's when they are next needed.
+        """
+        # Apply any pending rotations from the ancestors of this Block
+        self._locate()
+        Block._epoch += 1
+        self._position = top_left
+        self._size = size
+        self._located = Block._epoch
 
     def get_selected_block(self, location: Tuple[int, int], level: int) \
             -> 'Block':
@@ -272,44 +714,75 @@ class Block:
         Preconditions:
         - 0 <= level <= max_depth
         """
-        # Create lists representing the top left and bottom right corners of
-        # the block. This is done so we can easily tell if the given location
-        # is in the current block by using comparison operators.
-        tl_corner = list(self.position)
-        br_corner = [self.position[0] + self.size, self.position[1] + self.size]
+        return self._select(location[0], location[1], level)[0]
 
-        # If the given position is inside the block and the level is correct
-        if level == self.level and tl_corner <= list(location) < br_corner:
-            # Return the current block
-            return self
+    def get_selected_blocks(self, queries: Iterable[Tuple[int, int, int]]) \
+            -> List['Block']:
+        """Return the Blocks that get_selected_block would return for each of
+        the (x, y, level) triples in <queries>, in order.
 
-        # Or if the current block has no children, also return self
-        elif len(self.children) == 0:
-            return self
+        <queries> may also be a NumPy array with three columns.
+        """
+        if np is not None and isinstance(queries, np.ndarray):
+            queries = queries.tolist()
+        select = self._select
+        return [select(x, y, level)[0] for x, y, level in queries]
+
+    def morton_path(self, location: Tuple[int, int], level: int) \
+            -> Tuple[int, int]:
+        """Return the path from this Block to the Block that
+        get_selected_block would return for <location> and <level>.
+
+        The path is returned as a pair (code, length), where <length> is the
+        number of levels descended, and <code> holds two bits for each of
+        them, most significant first: the column (1 for the right half) and
+        then the row (1 for the lower half) of the quadrant entered.
+        """
+        _, code, length = self._select(location[0], location[1], level)
+        return code, length
 
-        # Otherwise find the selected block by recursing into the children
-        else:
-            midpoint = (self.position[0] + round(self.size / 2),
-                        self.position[1] + round(self.size / 2))
-
-            # Determine what quadrant location is in using the midpoint of self
-            if location[0] < midpoint[0]:
-                # Quadrant II or III / upper-left or lower-left
-                if location[1] < midpoint[1]:
-                    # Quadrant II / upper-left
-                    return self.children[1].get_selected_block(location, level)
-                else:
-                    # Quadrant III / lower-left
-                    return self.children[2].get_selected_block(location, level)
+    def _select(self, x: int, y: int, level: int) -> Tuple['Block', int, int]:
+        """Return the Block selected by get_selected_block for the location
+        (<x>, <y>) and <level>, along with its Morton path as described in
+        morton_path.
 
-            else:
-                # Quadrant I or IV / upper-right or lower-right
-                if location[1] < midpoint[1]:
-                    # Quadrant I / upper-right
-                    return self.children[0].get_selected_block(location, level)
-                else:
-                    # Quadrant IV / lower-right
-                    return self.children[3].get_selected_block(location, level)
+        The descent uses only integer arithmetic on the coordinates.  Rather
+        than applying pending rotations on the way down, it keeps track of
+        them and picks out the visible child directly.
+        """
+        self._locate()
+        block = self
+        left, top = self._position
+        size = self._size
+        turns = 0
+        code = 0
+        length = 0
+        while True:
+            # The same test as comparing the lists [left, top] <= [x, y] <
+            # [left + size, top + size], which is what selects this Block.
+            if block.level == level and \
+                    (x > left or (x == left and y >= top)) and \
+                    (x < left + size or (x == left + size and
+                                         y < top + size)):
+                break
+            if not block._children:
+                break
+
+            # half is round(size / 2), which rounds halves to even
+            half = size >> 1
+            if size & 1 and half & 1:
+                half += 1
+            column = 1 if x >= left + half else 0
+            row = 1 if y >= top + half else 0
+            quadrant = (column << 1) | row
+            turns = (turns + block._orientation) & 3
+            block = block._children[(_QUADRANT_INDEX[quadrant] + turns) & 3]
+            left += half * column
+            top += half * row
+            size = half
+            code = (code << 2) | quadrant
+            length += 1
+        return block, code, length
 
     def flatten(self) -> List[List[Tuple[int, int, int]]]:
         """Return a two-dimensional list representing this Block as rows
@@ -322,6 +795,24 @@ class Block:
         of the block at the cell location[i][j]
 
         L[0][0] represents the unit cell in the upper left corner of the Block.
+
+        The result is cached until this Block is next changed by swap, rotate
+        or smash, so it must not be mutated by the caller.  Only the dirty
+        parts of the tree are flattened again; the cached results of clean
+        sub blocks are reused.
+        """
+        self._locate()
+        if self._flat is not None:
+            Block.flatten_hits += 1
+            return self._flat
+        Block.flatten_misses += 1
+        self._flat = self._flatten_helper()
+        return self._flat
+
+    def _flatten_helper(self) -> List[List[Tuple[int, int, int]]]:
+        """Build and return the flattened representation of this Block, as
+        described in flatten, from the flattened representations of its
+        sub blocks.
         """
         # If the current block is solid return a flattened representation
         if self.colour:
@@ -352,6 +843,308 @@ class Block:
 
             return flat_block
 
+    def flatten_array(self) -> 'np.ndarray':
+        """Return a two-dimensional NumPy array representing this Block as
+        columns and rows of unit cells.
+
+        The array A has shape (2^{max_depth - level}, 2^{max_depth - level})
+        and dtype uint8, and A[i, j] is the index within COLOUR_LIST of the
+        colour of the unit cell at column i and row j, using the same layout
+        as flatten.
+
+        Like flatten, the result is cached until this Block is next changed,
+        so it must not be mutated by the caller.
+
+        Raise ImportError if NumPy is not installed.
+        """
+        if np is None:
+            raise ImportError('flatten_array requires NumPy')
+        self._locate()
+        if self._flat_array is not None:
+            return self._flat_array
+
+        # Fill in the cells of each undivided block with a slice assignment,
+        # working down from this Block without recursion.
+        cells = 2 ** (self.max_depth - self.level)
+        flat_array = np.empty((cells, cells), dtype=np.uint8)
+        stack = [(self, 0, 0, cells)]
+        while stack:
+            block, x, y, cells = stack.pop()
+            if block._colour is not None:
+                flat_array[x:x + cells, y:y + cells] = block._colour
+            else:
+                half = cells // 2
+                children = block.children
+                stack.append((children[0], x + half, y, half))
+                stack.append((children[1], x, y, half))
+                stack.append((children[2], x, y + half, half))
+                stack.append((children[3], x + half, y + half, half))
+        self._flat_array = flat_array
+        return flat_array
+
+    def board_hash(self) -> int:
+        """Return a 64-bit hash of the structure and colours of this Block.
+
+        Blocks with the same level, subdivisions and colours have the same
+        hash, and the hash of a given board is the same in every run.  It is
+        built from the hashes of the sub blocks, which are cached, so after
+        a move only the hashes of the moved block and its ancestors are
+        computed again.
+        """
+        self._locate()
+        return self._compute_hashes()[0]
+
+    def canonical_hash(self) -> int:
+        """Return a 64-bit hash of this Block that is the same for all of
+        its rotations and reflections.
+
+        It is the smallest of the hashes of the eight symmetries of this
+        Block, so it can be used to look up boards in a cache or table
+        without telling symmetric boards apart.
+        """
+        self._locate()
+        return min(self._compute_hashes())
+
+    def canonical_symmetry(self) -> Tuple[int, bool]:
+        """Return the symmetry that turns this Block into the canonical
+        representative of its rotations and reflections, as a pair
+        (turns, mirrored).
+
+        The canonical representative is this Block, reflected left to right
+        if <mirrored> is True, then rotated clockwise by <turns> quarter
+        turns.  Its board_hash is the canonical_hash of this Block.
+        """
+        self._locate()
+        hashes = self._compute_hashes()
+        symmetry = hashes.index(min(hashes))
+        return symmetry % 4, symmetry >= 4
+
+    def colour_areas(self) -> Dict[Tuple[int, int, int], int]:
+        """Return the number of unit cells of each colour of COLOUR_LIST
+        within this Block.
+
+        The counts are kept for every sub block once they have been found,
+        so this takes constant time until the next smash, which only
+        updates the counts of the smashed block and its ancestors.
+        """
+        return dict(zip(COLOUR_LIST, self._compute_areas()))
+
+    def colour_area(self, colour: Tuple[int, int, int]) -> int:
+        """Return the number of unit cells of colour <colour> within this
+        Block, or 0 if <colour> is not in COLOUR_LIST, since other colours
+        are not counted.
+
+        No blob of a colour of COLOUR_LIST within this Block can be larger
+        than this.
+        """
+        if colour not in COLOUR_LIST:
+            return 0
+        return self._compute_areas()[COLOUR_LIST.index(colour)]
+
+    def _compute_areas(self) -> Tuple[int, ...]:
+        """Return the number of unit cells of each colour within this Block,
+        as described for <_areas>, counting them if needed.
+        """
+        if self._areas is not None:
+            return self._areas
+        if self._colour is not None:
+            areas = [0] * len(COLOUR_LIST)
+            if self._colour < len(COLOUR_LIST):
+                areas[self._colour] = 4 ** (self.max_depth - self.level)
+            self._areas = tuple(areas)
+            return self._areas
+
+        child_areas = [child._compute_areas() for child in self._children]
+        self._areas = tuple(sum(areas) for areas in zip(*child_areas))
+        return self._areas
+
+    def _compute_hashes(self) -> Tuple[int, ...]:
+        """Return the hashes of the eight symmetries of this Block, as
+        described for <_hashes>, computing them if needed.
+        """
+        if self._hashes is not None:
+            return self._hashes
+        if self._colour is not None:
+            self._hashes = (_leaf_key(self.level, self._colour),) * 8
+            return self._hashes
+
+        # The children are used in their stored order, so the pending
+        # rotation of this Block is not applied to them here.
+        child_hashes = [child._compute_hashes() for child in self._children]
+        hashes = []
+        for symmetry in range(8):
+            # Rotating by <turns> moves the child at index (k + turns) % 4
+            # to index k, rotating it by <turns> too.  Reflecting first
+            # moves the child at index _MIRROR_INDEX[k] to index k.
+            turns = symmetry % 4
+            value = _LEVEL_KEYS[self.level]
+            for k in range(4):
+                index = (k + turns) % 4
+                if symmetry >= 4:
+                    index = _MIRROR_INDEX[index]
+                value ^= _mix(child_hashes[index][symmetry] +
+                              _QUADRANT_KEYS[k])
+            hashes.append(value)
+        self._hashes = _rotate_hashes(tuple(hashes), self._orientation)
+        return self._hashes
+
+
+# The colours that blocks may have.  A Block stores the index of its colour
+# in this list, which starts with COLOUR_LIST and grows if any other colour
+# is used.
+_PALETTE = list(COLOUR_LIST)
+_PALETTE_INDEX = {colour: i for i, colour in enumerate(_PALETTE)}
+
+
+def _palette_index(colour: Tuple[int, int, int]) -> int:
+    """Return the index of <colour> in the colour palette, adding it to the
+    palette if it is not there yet.
+    """
+    index = _PALETTE_INDEX.get(colour)
+    if index is None:
+        index = len(_PALETTE)
+        _PALETTE.append(colour)
+        _PALETTE_INDEX[colour] = index
+    return index
+
+
+class MoveJournal:
+    """A record of the moves made on a Blocky board, which lets them be
+    undone and redone.
+
+    Each move is stored as a tuple holding the Block it was applied to, the
+    name of the action ('swap', 'rotate' or 'smash') and the data needed to
+    make or reverse it.  For a swap or rotation that is the direction.  For
+    a smash it is a list holding the children, orientation and colour index
+    that the Block does not currently have: those it had before the smash
+    while the smash is in effect, and those the smash gave it while it is
+    undone.
+
+    === Public Attributes ===
+    done:
+        The moves that are in effect, from the oldest to the newest.
+    undone:
+        The moves that have been undone and may be redone, from the last
+        to be undone to the first.
+
+    === Representation Invariants ===
+    - Making a new move empties <undone>.
+    """
+    done: List[Tuple[Block, str, object]]
+    undone: List[Tuple[Block, str, object]]
+
+    def __init__(self) -> None:
+        """Initialize this journal with no moves.
+        """
+        self.done = []
+        self.undone = []
+
+    def record(self, move: Tuple[Block, str, object]) -> None:
+        """Record that <move> has just been made.
+        """
+        self.done.append(move)
+        self.undone.clear()
+
+    def clear(self) -> None:
+        """Forget all of the moves in this journal.
+        """
+        self.done.clear()
+        self.undone.clear()
+
+
+def _mix(value: int) -> int:
+    """Return a well-mixed 64-bit hash of the non-negative int <value>.
+    """
+    value &= _HASH_MASK
+    value = ((value ^ (value >> 30)) * 0xbf58476d1ce4e5b9) & _HASH_MASK
+    value = ((value ^ (value >> 27)) * 0x94d049bb133111eb) & _HASH_MASK
+    return value ^ (value >> 31)
+
+
+# The random keys from which block hashes are built.  They come from a
+# fixed seed so that hashes are the same in every run.
+_HASH_MASK = (1 << 64) - 1
+_MAX_HASH_LEVEL = 64
+_key_source = random.Random(2017)
+_LEAF_KEYS = [[_key_source.getrandbits(64) for _ in COLOUR_LIST]
+              for _ in range(_MAX_HASH_LEVEL)]
+_LEVEL_KEYS = [_key_source.getrandbits(64) for _ in range(_MAX_HASH_LEVEL)]
+_QUADRANT_KEYS = [_key_source.getrandbits(64) for _ in range(4)]
+
+
+def _leaf_key(level: int, colour: int) -> int:
+    """Return the hash of an undivided Block at level <level> whose colour
+    has index <colour> in the colour palette.
+
+    Colours beyond those of COLOUR_LIST, which have no random key, get a
+    key mixed from the level key and their index.
+    """
+    if colour < len(COLOUR_LIST):
+        return _LEAF_KEYS[level][colour]
+    return _mix(_LEVEL_KEYS[level] ^ _mix(colour))
+
+
+def _rotate_hashes(hashes: Tuple[int, ...], turns: int) -> Tuple[int, ...]:
+    """Return the hashes of the eight symmetries of a Block, given the
+    hashes <hashes> of the symmetries of that Block before it was rotated
+    clockwise by <turns> quarter turns.
+    """
+    if turns == 0:
+        return hashes
+    # Rotating the mirror image of a rotated Block the other way undoes
+    # the rotation, so the second half moves in the opposite direction.
+    return hashes[turns:4] + hashes[:turns] + \
+        hashes[8 - turns:] + hashes[4:8 - turns]
+
+
+def canonical_form(block: Block) -> Block:
+    """Return a new board that is the canonical representative of the
+    rotations and reflections of <block>, as described in
+    Block.canonical_symmetry.
+
+    The new board has the same position and size as <block>, and every
+    board in the same set of symmetries gives an identical result.
+    """
+    turns, mirrored = block.canonical_symmetry()
+    root = Block(block.level, block.colour)
+    root.max_depth = block.max_depth
+    root.update_block_locations(block.position, block.size)
+    stack = [(root, block)]
+    while stack:
+        copy, original = stack.pop()
+        children = original.children
+        if len(children) == 0:
+            continue
+        copy._children = []
+        for k in range(4):
+            index = (k + turns) % 4
+            if mirrored:
+                index = _MIRROR_INDEX[index]
+            child = Block(copy.level + 1, children[index].colour)
+            child.max_depth = copy.max_depth
+            child.parent = copy
+            copy._children.append(child)
+            stack.append((child, children[index]))
+    return root
+
+
+def _rotate_grid(grid: List[List[Tuple[int, int, int]]], turns: int) \
+        -> List[List[Tuple[int, int, int]]]:
+    """Return a copy of the flattened representation <grid> rotated
+    clockwise by <turns> quarter turns.
+    """
+    for _ in range(turns):
+        grid = [list(row) for row in reversed(list(zip(*grid)))]
+    return grid
+
+
+def reset_flatten_counters() -> None:
+    """Reset the flatten cache hit and miss counters of the Block class.
+    """
+    Block.flatten_hits = 0
+    Block.flatten_misses = 0
+
+
 def random_init(level: int, max_depth: int) -> 'Block':
     """Return a randomly-generated Block with level <level> and subdivided
     to a maximum depth of <max_depth>.
@@ -360,30 +1153,113 @@ def random_init(level: int, max_depth: int) -> 'Block':
     except position and size.  They can be set by the client, using method
     update_block_locations.
 
+    The blocks are generated in pre-order without recursion, drawing from
+    the random module one block at a time.
+
     Precondition:
         level <= max_depth
     """
-    # If this Block is not already at the maximum allowed depth, it can
-    # be subdivided. Use a random number to decide whether or not to
-    # subdivide it further.
-    #print('Random Init Initiated')
-    block = Block(level)
-    block.max_depth = max_depth
-    subdivide_choice = random.random() if level < max_depth else 2
-
-    if subdivide_choice < math.exp(-0.25 * level):
-        # Four times, generate a random block at level + 1 with the same
-        # max_depth. Set that random block's parent to block. Add that random
-        # block to block.children
-        for _ in range(0, 4):
-            sub_block = random_init(level + 1, max_depth)
-            sub_block.parent = block
-            block.children.append(sub_block)
-    else:
-        # Set colour
-        colour_choice = random.randint(0, 3)
-        block.colour = COLOUR_LIST[colour_choice]
-    return block
+    root = Block(level)
+    root.max_depth = max_depth
+    stack = [root]
+    while stack:
+        block = stack.pop()
+
+        # If this Block is not already at the maximum allowed depth, it can
+        # be subdivided. Use a random number to decide whether or not to
+        # subdivide it further.
+        subdivide_choice = random.random() if block.level < max_depth else 2
+
+        if subdivide_choice < math.exp(-0.25 * block.level):
+            # Four times, create a block at level + 1 with the same max_depth
+            # and block as its parent, and add it to block.children.
+            block._children = []
+            for _ in range(0, 4):
+                sub_block = Block(block.level + 1)
+                sub_block.max_depth = max_depth
+                sub_block.parent = block
+                block._children.append(sub_block)
+            # Push in reverse so that the sub blocks are generated in order
+            stack.extend(reversed(block._children))
+        else:
+            # Set colour
+            block._colour = random.randint(0, 3)
+    return root
+
+
+def generate_board(max_depth: int, size: int,
+                   rng: Union[random.Random, 'np.random.Generator',
+                              None] = None) -> Block:
+    """Return a randomly-generated root Block subdivided to a maximum depth
+    of <max_depth>, positioned at (0, 0) with the given <size>.
+
+    Each block is subdivided with the same probability as in random_init,
+    but the board is built one level at a time, drawing all of the random
+    numbers needed for a level at once from <rng>.  <rng> may be a
+    random.Random or a NumPy Generator, and generators of the same type
+    and seed produce identical boards.  If <rng> is None, a random.Random
+    seeded from the random module is used.
+
+    Precondition:
+        max_depth >= 0
+    """
+    if rng is None:
+        rng = random.Random(random.getrandbits(64))
+
+    root = Block(0)
+    root.max_depth = max_depth
+    blocks = [root]
+    for level in range(max_depth + 1):
+        # Decide which of the blocks at this level to subdivide
+        if level < max_depth:
+            choices = _draw_uniform(rng, len(blocks))
+        else:
+            choices = [2] * len(blocks)
+        threshold = math.exp(-0.25 * level)
+
+        next_blocks = []
+        leaves = []
+        for block, choice in zip(blocks, choices):
+            if choice < threshold:
+                block._children = []
+                for _ in range(4):
+                    sub_block = Block(level + 1)
+                    sub_block.max_depth = max_depth
+                    sub_block.parent = block
+                    block._children.append(sub_block)
+                next_blocks.extend(block._children)
+            else:
+                leaves.append(block)
+
+        # Colour the blocks at this level that were not subdivided
+        for block, colour in zip(leaves, _draw_colours(rng, len(leaves))):
+            block._colour = colour
+        blocks = next_blocks
+
+    root.update_block_locations((0, 0), size)
+    return root
+
+
+def _draw_uniform(rng: Union[random.Random, 'np.random.Generator'],
+                  count: int) -> List[float]:
+    """Return <count> floats drawn uniformly from [0, 1) using <rng>.
+    """
+    if np is not None and isinstance(rng, np.random.Generator):
+        return rng.random(count).tolist()
+    draw = rng.random
+    return [draw() for _ in range(count)]
+
+
+def _draw_colours(rng: Union[random.Random, 'np.random.Generator'],
+                  count: int) -> List[int]:
+    """Return <count> indices into COLOUR_LIST drawn uniformly using <rng>.
+    """
+    if np is not None and isinstance(rng, np.random.Generator):
+        return rng.integers(0, len(COLOUR_LIST), count).tolist()
+    # COLOUR_LIST has four colours, so two random bits choose each one
+    bits = rng.getrandbits(2 * count) if count > 0 else 0
+    return [(bits >> (2 * i)) & 3 for i in range(count)]
+
 
 def attributes_str(b: Block, verbose) -> str:
     """Return a str that is a concise representation of the attributes of <b>.
@@ -435,7 +1311,8 @@ if __name__ == '__main__':
         'allowed-io': ['print_block_indented'],
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing',
-            'block', 'goal', 'player', 'renderer', 'math'
+            'block', 'goal', 'player', 'renderer', 'math', 'numpy',
+            'weakref'
         ],
         'max-attributes': 15
     })
@@ -0,0 +1,96 @@
+"""Assignment 2 - Blocky
+
+=== CSC148 Fall 2017 ===
+Diane Horton and David Liu
+Department of Computer Science,
+University of Toronto
+
+
+=== Module Description ===
+
+This file contains the diff function, which finds the parts of two boards
+that differ.
+
+The two boards are walked together, one pair of blocks covering the same
+part of the board at a time.  Pairs that are the same object, or that have
+the same board_hash, are skipped without looking inside them.  Since a move
+only changes the cached hashes of the moved block and its ancestors, the
+work done grows with the size of the change rather than the size of the
+board.
+
+diff works on both Blocks and PersistentBlocks.  PersistentBlocks that
+share sub blocks are compared by identity only.
+"""
+from typing import Optional, Tuple, List, Union
+from block import Block
+from persistent_block import PersistentBlock
+
+AnyBlock = Union[Block, PersistentBlock]
+
+# A part of the board that differs: the block covering it in each board,
+# then the (x, y) position and the size of the part in pixels.
+Change = Tuple[AnyBlock, AnyBlock, Tuple[int, int], int]
+
+
+def diff(a: AnyBlock, b: AnyBlock,
+         top_left: Optional[Tuple[int, int]] = None,
+         size: Optional[int] = None) -> List[Change]:
+    """Return the parts of the board <b> that differ from the board <a>.
+
+    <a> and <b> must be at the same level.  Each part of the board is
+    reported at the deepest level where the two boards still differ: a
+    pair of blocks is reported if either is undivided and they are not
+    the same, and otherwise the pairs of their children are compared.
+    Where the two boards are the same, nothing is reported.
+
+    The pixel positions of the parts are worked out as in
+    Block.update_block_locations, starting from <top_left> and <size>.
+    If these are not given, the position and size of <b> are used, which
+    only Blocks have.
+    """
+    if top_left is None or size is None:
+        top_left = b.position
+        size = b.size
+
+    changes = []
+    stack = [(a, b, top_left, size)]
+    while stack:
+        block_a, block_b, (x, y), size = stack.pop()
+        if _same(block_a, block_b):
+            continue
+        children_a = block_a.children
+        children_b = block_b.children
+        if len(children_a) == 0 or len(children_b) == 0:
+            changes.append((block_a, block_b, (x, y), size))
+            continue
+
+        half = round(size / 2)
+        positions = [(x + half, y), (x, y), (x, y + half),
+                     (x + half, y + half)]
+        for i in range(4):
+            stack.append((children_a[i], children_b[i], positions[i], half))
+    return changes
+
+
+def _same(a: AnyBlock, b: AnyBlock) -> bool:
+    """Return whether the blocks <a> and <b> are known to have the same
+    structure and colours, without looking at their descendants.
+    """
+    if a is b:
+        return True
+    if a.colour is not None or b.colour is not None:
+        return a.colour == b.colour
+    if isinstance(a, Block) and isinstance(b, Block):
+        return a.board_hash() == b.board_hash()
+    return False
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing',
+            'block', 'persistent_block'
+        ],
+        'max-attributes': 15
+    })
@@ -0,0 +1,238 @@
+"""Assignment 2 - Blocky
+
+=== CSC148 Fall 2017 ===
+Diane Horton and David Liu
+Department of Computer Science,
+University of Toronto
+
+
+=== Module Description ===
+
+This file contains functions for saving and loading boards in a compact
+binary format, and the BoardCorpus class for reading files that hold many
+such boards.
+
+Each board is stored as a record made up of a header, holding the level and
+max_depth of its root block and the number of bits that follow, and then a
+bitstream describing its blocks in pre-order.  Every block has one bit that
+is 1 if it is subdivided and 0 otherwise, and each undivided block is then
+followed by two bits holding the index of its colour in COLOUR_LIST.  The
+bitstream is padded with zeros to a whole number of bytes.
+
+A corpus file is the bytes CORPUS_MAGIC followed by any number of records.
+"""
+from typing import Iterable, Iterator
+from array import array
+import mmap
+import struct
+from block import Block
+from renderer import COLOUR_LIST
+
+# The header of each record: root level, max_depth and number of bits
+RECORD_HEADER = struct.Struct('<BBI')
+
+# The bytes that every corpus file starts with
+CORPUS_MAGIC = b'BLOCKY1\n'
+
+# The two-bit colour codes, indexed by the position of the colour in
+# COLOUR_LIST
+_COLOUR_BITS = ['{:02b}'.format(i) for i in range(len(COLOUR_LIST))]
+
+
+def dump(block: Block) -> bytes:
+    """Return the binary record describing <block> and its descendants.
+
+    The position, size and highlighting of the blocks are not stored.
+    """
+    bits = []
+    stack = [block]
+    while stack:
+        current = stack.pop()
+        children = current.children
+        if len(children) == 0:
+            bits.append('0')
+            bits.append(_COLOUR_BITS[COLOUR_LIST.index(current.colour)])
+        else:
+            bits.append('1')
+            stack.extend(reversed(children))
+    stream = ''.join(bits)
+    num_bits = len(stream)
+    num_bytes = (num_bits + 7) // 8
+    # Pad on the right so the first block is in the high bit of byte 0
+    payload = int(stream, 2) << (8 * num_bytes - num_bits)
+    return RECORD_HEADER.pack(block.level, block.max_depth, num_bits) + \
+        payload.to_bytes(num_bytes, 'big')
+
+
+def load(data: bytes, offset: int = 0) -> Block:
+    """Return the Block described by the binary record that starts at
+    <offset> within <data>.
+
+    <data> may be any object supporting the buffer protocol, such as bytes
+    or an mmap.  The returned Block has position (0, 0) and size 0; they
+    can be set using update_block_locations.
+
+    Raise ValueError if the record is truncated or malformed.
+    """
+    end = offset + record_length(data, offset)
+    level, max_depth, num_bits = RECORD_HEADER.unpack_from(data, offset)
+    start = offset + RECORD_HEADER.size
+    payload = int.from_bytes(data[start:end], 'big')
+    stream = format(payload, '0{}b'.format(8 * (end - start)))
+
+    # The subdivided blocks whose children are still being read, each as
+    # its level and the children read so far.  A block is built once all
+    # of its children have been.
+    parents = []
+    i = 0
+    try:
+        while True:
+            block_level = parents[-1][0] + 1 if parents else level
+            if stream[i] == '1':
+                if block_level >= max_depth:
+                    # Blocks at the maximum depth cannot be subdivided
+                    raise ValueError('malformed board record')
+                parents.append((block_level, []))
+                i += 1
+                continue
+            block = Block(block_level,
+                          COLOUR_LIST[int(stream[i + 1:i + 3], 2)])
+            block.max_depth = max_depth
+            i += 3
+            while parents and len(parents[-1][1]) == 3:
+                parent_level, children = parents.pop()
+                children.append(block)
+                block = Block(parent_level, None, children)
+                block.max_depth = max_depth
+            if not parents:
+                break
+            parents[-1][1].append(block)
+    except IndexError:
+        raise ValueError('malformed board record')
+    if i != num_bits:
+        raise ValueError('malformed board record')
+    return block
+
+
+def record_length(data: bytes, offset: int = 0) -> int:
+    """Return the number of bytes taken by the binary record that starts at
+    <offset> within <data>.
+
+    Raise ValueError if the header of the record, or the record itself, is
+    cut off by the end of <data>.
+    """
+    if offset + RECORD_HEADER.size > len(data):
+        raise ValueError('truncated board record')
+    num_bits = RECORD_HEADER.unpack_from(data, offset)[2]
+    length = RECORD_HEADER.size + (num_bits + 7) // 8
+    if offset + length > len(data):
+        raise ValueError('truncated board record')
+    return length
+
+
+def write_corpus(path: str, boards: Iterable[Block]) -> int:
+    """Write a corpus file at <path> holding each of <boards>, and return
+    the number of boards written.
+    """
+    count = 0
+    with open(path, 'wb') as corpus_file:
+        corpus_file.write(CORPUS_MAGIC)
+        for board in boards:
+            corpus_file.write(dump(board))
+            count += 1
+    return count
+
+
+class BoardCorpus:
+    """A read-only sequence of the boards in a corpus file.
+
+    The file is memory-mapped, and each board is only decoded when it is
+    asked for.  A BoardCorpus should be closed when it is no longer needed,
+    or used in a with statement.
+
+    === Public Attributes ===
+    path:
+        The path of the corpus file.
+    """
+    # === Private Attributes ===
+    # _file:
+    #     The open corpus file.
+    # _map:
+    #     The memory map of the corpus file.
+    # _offsets:
+    #     The offset of each record within the file, in order.
+    path: str
+    _offsets: array
+
+    def __init__(self, path: str) -> None:
+        """Open the corpus file at <path> and find the records within it.
+
+        Raise ValueError if the file is not a corpus file, or if its last
+        record is cut off.
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file cannot be mapped
+            self._file.close()
+            raise ValueError('not a Blocky corpus file')
+        try:
+            if self._map[:len(CORPUS_MAGIC)] != CORPUS_MAGIC:
+                raise ValueError('not a Blocky corpus file')
+
+            # Only the record headers are read to find where each board
+            # starts
+            self._offsets = array('q')
+            offset = len(CORPUS_MAGIC)
+            while offset < len(self._map):
+                self._offsets.append(offset)
+                offset += record_length(self._map, offset)
+        except ValueError:
+            self.close()
+            raise
+
+    def __len__(self) -> int:
+        """Return the number of boards in this corpus.
+        """
+        return len(self._offsets)
+
+    def __getitem__(self, index: int) -> Block:
+        """Return the board at <index> in this corpus.
+        """
+        return load(self._map, self._offsets[index])
+
+    def __iter__(self) -> Iterator[Block]:
+        """Return an iterator over the boards in this corpus, in order.
+        """
+        for offset in self._offsets:
+            yield load(self._map, offset)
+
+    def close(self) -> None:
+        """Close the corpus file.
+        """
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> 'BoardCorpus':
+        """Return this corpus, for use in a with statement.
+        """
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        """Close this corpus at the end of a with statement.
+        """
+        self.close()
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', 'array', 'mmap', 'struct',
+            'block', 'renderer'
+        ],
+        'max-attributes': 15
+    })
@@ -17,7 +17,8 @@ can call to try playing the game in several different configurations.
 import random
 from typing import List
 from block import Block, random_init
-from goal import BlobGoal, PerimeterGoal
+from linear_block import linear_random_init
+from goal import BlobGoal, PerimeterGoal, score_goals
 from player import Player, HumanPlayer, RandomPlayer, SmartPlayer
 from renderer import Renderer, COLOUR_LIST, colour_name, BOARD_WIDTH
 
@@ -27,7 +28,8 @@ class Game:
 
     === Public Attributes ===
     board:
-        The Blocky board on which this game will be played.
+        The Blocky board on which this game will be played.  This is either
+        a Block or a LinearBlock view of the root of a LinearQuadtree.
     renderer:
         The object that is capable of drawing our Blocky board on the screen,
         and tracking user interactions with the Blocky board.
@@ -44,15 +46,24 @@ class Game:
     def __init__(self, max_depth: int,
                  num_human: int,
                  random_players: int,
-                 smart_players: List[int]) -> None:
+                 smart_players: List[int],
+                 linear: bool = False,
+                 workers: int = 1) -> None:
         """Initialize this game, as described in the Assignment 2 handout.
 
+        If <linear> is True, store the board in a LinearQuadtree rather than
+        as a tree of Block objects.  SmartPlayers score their moves in
+        <workers> processes.
+
         Precondition:
             2 <= max_depth <= 5
         """
         self.renderer = Renderer(num_human + random_players +
                                  len(smart_players))
-        self.board = random_init(0, max_depth)
+        if linear:
+            self.board = linear_random_init(max_depth)
+        else:
+            self.board = random_init(0, max_depth)
         self.board.update_block_locations((0, 0), BOARD_WIDTH)
         self.players = []
 
@@ -75,10 +86,11 @@ class Game:
                                                        player_types[i],
                                                        goal_type,
                                                        len(self.players)))
-        # Set difficulties for SmartPlayers and display goals
+        # Set difficulties and workers for SmartPlayers and display goals
         for player in self.players:
             if isinstance(player, SmartPlayer):
                 player.difficulty = smart_players.pop()
+                player.workers = workers
             self.renderer.display_goal(player)
 
         self.renderer.draw(self.board, 0)
@@ -144,15 +156,21 @@ class Game:
             if self.players[index].make_move(self.board) == 1:
                 break
             else:
+                # Moves made in the game are never undone, so the journal
+                # does not need to keep them.
+                self.board.clear_history()
                 print(f'Player {player.id} CURRENT SCORE: ' +
                       f'{player.goal.score(self.board)}')
                 index = (index + 1) % len(self.players)
 
-        # Determine and report the winner.
+        # Determine and report the winner.  All of the goals are scored
+        # together, in one pass over the board.
+        scores = score_goals(self.board,
+                             [player.goal for player in self.players])
         max_score = 0
         winning_player = 0
         for i in range(len(self.players)):
-            score = self.players[i].goal.score(self.board)
+            score = scores[i]
             print(f'Player {i} : {score}')
             if score > max_score:
                 max_score = score
@@ -204,7 +222,7 @@ if __name__ == '__main__':
         'allowed-io': ['run_game'],
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing',
-            'block', 'goal', 'player', 'renderer'
+            'block', 'goal', 'player', 'renderer', 'linear_block'
         ],
     })
     # sample_game()
@@ -9,10 +9,42 @@ University of Toronto
 === Module Description ===
 
 This file contains the Goal class hierarchy.
+
+Goals score Blocks without flattening them.  A PerimeterGoal only visits
+the blocks that touch the sides of the board.  A BlobGoal keeps a summary
+of every sub block it has scored, describing the blobs that reach each of
+its sides, and the summary of a block is merged from those of its
+children.  Summaries are looked up by the canonical hash of the block, so
+after a move only the blocks on the path from the moved block to the root
+are summarized again, and a rotated or reflected sub block reuses the
+summary of the original with its sides rearranged.  Goals also score a
+Bitboard with a few big int operations, and many boards of the same size
+at once with score_batch, from a NumPy array of their colour indices.
 """
 
-from typing import List, Tuple
+from typing import Any, Dict, List, Tuple, Union
+try:
+    import numpy as np
+except ImportError:
+    np = None
 from block import Block
+from bitboard import Bitboard
+from renderer import COLOUR_LIST
+
+# Each side of a summary is stored for the sides of the block in this order:
+# north (left to right), south (left to right), west (top to bottom) and
+# east (top to bottom).
+Sides = Tuple[Any, Any, Any, Any]
+
+# The most summaries a goal keeps before it forgets them all
+_SUMMARY_LIMIT = 1 << 16
+
+# The sides of a block as bits, and the sides of its parent that each child
+# in Block.children touches
+_NORTH, _SOUTH, _WEST, _EAST = 1, 2, 4, 8
+_ALL_SIDES = _NORTH | _SOUTH | _WEST | _EAST
+_CHILD_SIDES = (_NORTH | _EAST, _NORTH | _WEST, _SOUTH | _WEST,
+                _SOUTH | _EAST)
 
 
 class Goal:
@@ -35,25 +67,55 @@ class Goal:
     def score(self, board: Block) -> int:
         """Return the current score for this goal on the given board.
 
+        <board> may also be a LinearBlock, or a Bitboard of a board.
+
         The score is always greater than or equal to 0.
         """
         raise NotImplementedError
 
+    def score_batch(self, grids: 'np.ndarray') -> 'np.ndarray':
+        """Return the score for this goal on each of the boards in <grids>,
+        as an array of N ints.
+
+        <grids> is an (N, S, S) array holding N flattened boards, each in
+        the format of Block.flatten_array: the index in COLOUR_LIST of the
+        colour of each unit cell, by column and then row.  stack_boards
+        makes such an array.  The scores are the same as those of score.
+        """
+        raise NotImplementedError
+
     def description(self) -> str:
         """Return a description of this goal.
         """
         raise NotImplementedError
 
+    def _target_cells(self, grids: 'np.ndarray') -> 'np.ndarray':
+        """Return a boolean array that is True for the unit cells in
+        <grids> of this goal's target colour.
+        """
+        if self.colour not in COLOUR_LIST:
+            return np.zeros(grids.shape, dtype=bool)
+        return np.asarray(grids) == COLOUR_LIST.index(self.colour)
+
 
 class BlobGoal(Goal):
     """A goal to create the largest connected blob of this goal's target
     colour, anywhere within the Block.
+
+    === Private Attributes ===
+    _summaries:
+        The summaries of the sub blocks this goal has scored, keyed by
+        their canonical hash and max_depth.  Each is the summary of the
+        canonical form of the sub block, as described in
+        Block.canonical_symmetry.
     """
+    _summaries: Dict[Tuple[int, int], Any]
 
     def __init__(self, target_colour: Tuple[int, int, int]) -> None:
         """Initialize this BlobGoal to have the given target colour.
         """
         Goal.__init__(self, target_colour)
+        self._summaries = {}
 
     def score(self, board: Block) -> int:
         """Return the current score based on the largest blob of the target
@@ -61,84 +123,174 @@ class BlobGoal(Goal):
 
         The score is always greater than or equal to 0.
         """
-        # Get a flattened representation of the board
-        flat_board = board.flatten()
-
-        # Create a representation of the board to keep track of visited blocks
-        size = len(flat_board[0])
-        visited = []
-        for _ in range(size):
-            visited.append([-1] * size)
-
-        # Go through each cell, keeping track of the largest blob size
-        max_blob_size = 0
-        for i in range(size):
-            for j in range(size):
-                blob_size = self._undiscovered_blob_size((i, j),
-                                                         flat_board, visited)
-                
-                if blob_size > max_blob_size:
-                    max_blob_size = blob_size
-
-        return max_blob_size
+        if isinstance(board, Bitboard):
+            return board.largest_blob(self.colour)
+        if not isinstance(board, Block):
+            return largest_blobs(board).get(self.colour, 0)
+        sides, areas, best = self._summarize(board)
+        return max([best] + areas)
+
+    def score_batch(self, grids: 'np.ndarray') -> 'np.ndarray':
+        """Return the score for this goal on each of the boards in <grids>,
+        as described in Goal.score_batch.
+
+        The target cells of all of the boards are joined into blobs at
+        once.  Every cell starts out pointing to itself.  In each round,
+        every pair of neighbouring target cells whose blobs differ hooks the
+        blob with the smaller label onto the one with the larger label, and
+        then pointers are followed until every cell points to the label of
+        its blob.  The rounds stop once no neighbouring target cells are in
+        different blobs.
+        """
+        target = self._target_cells(grids)
+        if target.size == 0:
+            return np.zeros(target.shape[0], dtype=np.int64)
+        cells = np.arange(target.size).reshape(target.shape)
+
+        # The pairs of neighbouring target cells, in columns and in rows
+        first = []
+        second = []
+        for before, after in [(np.s_[:, :-1], np.s_[:, 1:]),
+                              (np.s_[:, :, :-1], np.s_[:, :, 1:])]:
+            both = target[before] & target[after]
+            first.append(cells[before][both])
+            second.append(cells[after][both])
+        first = np.concatenate(first)
+        second = np.concatenate(second)
+
+        labels = cells.reshape(-1).copy()
+        while True:
+            first_labels = labels[first]
+            second_labels = labels[second]
+            differ = first_labels != second_labels
+            if not differ.any():
+                break
+            np.maximum.at(labels,
+                          np.minimum(first_labels, second_labels)[differ],
+                          np.maximum(first_labels, second_labels)[differ])
+            jumped = labels[labels]
+            while not np.array_equal(jumped, labels):
+                labels = jumped
+                jumped = labels[labels]
+
+        # Each label is the index of a cell on the same board, so the sizes
+        # of the blobs can be counted by label and split up by board
+        sizes = np.bincount(labels[target.reshape(-1)], minlength=target.size)
+        return sizes.reshape(target.shape[0], -1).max(axis=1)
+
+    def _summarize(self, block: Block) -> Any:
+        """Return the summary of <block>, as described in _leaf_summary,
+        reusing the summaries of any sub blocks that are the same as, or
+        symmetric to, sub blocks already summarized.
+        """
+        turns, mirrored = block.canonical_symmetry()
+        key = (block.canonical_hash(), block.max_depth)
+        summary = self._summaries.get(key)
+        if summary is not None:
+            return self._transform(summary, turns, mirrored, True)
+
+        children = block.children
+        if len(children) == 0 or (self.colour in COLOUR_LIST and
+                                  block.colour_area(self.colour) == 0):
+            # A block with none of the target colour is summarized like an
+            # undivided block of another colour, without visiting its
+            # descendants.  Only the colours of COLOUR_LIST are counted.
+            summary = self._leaf_summary(block)
+        else:
+            summary = self._merge([self._summarize(child)
+                                   for child in children])
+        if len(self._summaries) >= _SUMMARY_LIMIT:
+            self._summaries.clear()
+        self._summaries[key] = self._transform(summary, turns, mirrored,
+                                               False)
+        return summary
+
+    def _leaf_summary(self, block: Block) -> Any:
+        """Return the summary of the undivided block <block>.
+
+        A blob summary is a tuple (sides, areas, best).  Each side is a
+        list of runs of cells along that side, as described in _concatenate,
+        but labelled with the number of the blob of the target colour they
+        belong to, or -1 for cells of other colours.  <areas> holds the area
+        of each numbered blob, which are those that touch the sides, and
+        <best> is the area of the largest blob that does not.
+        """
+        width = 2 ** (block.max_depth - block.level)
+        if block.colour == self.colour:
+            side = [(width, 0)]
+            return (side, side, side, side), [width * width], 0
+        side = [(width, -1)]
+        return (side, side, side, side), [], 0
+
+    def _merge(self, summaries: List[Any]) -> Any:
+        """Return the summary of a block whose children have the summaries
+        <summaries>, in the same order as Block.children.
+        """
+        # Number the blobs of all four children apart
+        parents = []
+        areas = []
+        best = 0
+        child_sides = []
+        for sides, child_areas, child_best in summaries:
+            offset = len(areas)
+            child_sides.append(tuple(_relabel(side, offset) for side in sides))
+            parents.extend(range(offset, offset + len(child_areas)))
+            areas.extend(child_areas)
+            best = max(best, child_best)
+
+        # Join the blobs that touch where the children meet
+        ur, ul, ll, lr = child_sides
+        _join_labels(ul[3], ur[2], parents)
+        _join_labels(ll[3], lr[2], parents)
+        _join_labels(ul[1], ll[0], parents)
+        _join_labels(ur[1], lr[0], parents)
+
+        # Add up the area of each joined blob
+        blob_areas = [0] * len(areas)
+        for label in range(len(areas)):
+            blob_areas[_find(parents, label)] += areas[label]
+
+        # Number the blobs that touch the sides of the merged block again,
+        # and keep only the largest of the others
+        numbers = {}
+        sides = []
+        for first, second in ((ul[0], ur[0]), (ll[1], lr[1]),
+                              (ul[2], ll[2]), (ur[3], lr[3])):
+            side = []
+            for end, label in _concatenate(first, second):
+                if label != -1:
+                    root = _find(parents, label)
+                    if root not in numbers:
+                        numbers[root] = len(numbers)
+                    label = numbers[root]
+                if side and side[-1][1] == label:
+                    side[-1] = (end, label)
+                else:
+                    side.append((end, label))
+            sides.append(side)
+        new_areas = [0] * len(numbers)
+        for root, number in numbers.items():
+            new_areas[number] = blob_areas[root]
+        for label in range(len(areas)):
+            if parents[label] == label and label not in numbers:
+                best = max(best, blob_areas[label])
+        return tuple(sides), new_areas, best
+
+    def _transform(self, summary: Any, turns: int, mirrored: bool,
+                   inverse: bool) -> Any:
+        """Return the summary of a block with summary <summary> after it is
+        reflected left to right if <mirrored>, then rotated clockwise by
+        <turns> quarter turns.  If <inverse> is True, undo that symmetry
+        instead.
+        """
+        sides, areas, best = summary
+        return _transform_sides(sides, turns, mirrored, inverse), areas, best
 
     def description(self) -> str:
         """Return a description of this goal.
         """
         return "Create the largest blob of this colour"
 
-    def _undiscovered_blob_size(self, pos: Tuple[int, int],
-                                board: List[List[Tuple[int, int, int]]],
-                                visited: List[List[int]]) -> int:
-        """Return the size of the largest connected blob that (a) is of this
-        Goal's target colour, (b) includes the cell at <pos>, and (c) involves
-        only cells that have never been visited.
-
-        If <pos> is out of bounds for <board>, return 0.
-
-        <board> is the flattened board on which to search for the blob.
-        <visited> is a parallel structure that, in each cell, contains:
-           -1  if this cell has never been visited
-            0  if this cell has been visited and discovered
-               not to be of the target colour
-            1  if this cell has been visited and discovered
-               to be of the target colour
-
-        Update <visited> so that all cells that are visited are marked with
-        either 0 or 1.
-        """
-        # If the given position is out of bounds, or the cell at the given
-        # position has already been visited, return 0
-        if pos[0] < 0 or pos[1] < 0 or pos[0] >= len(board[0]) or \
-        pos[1] >= len(board[0]) or visited[pos[0]][pos[1]] == 1 or \
-        visited[pos[0]][pos[1]] == 0:
-            return 0
-
-        # If the position is valid and the cell has not been visited yet
-        else:
-            # Return 0 and mark the cell if the cell is not the target colour
-            if self.colour != board[pos[0]][pos[1]]:
-                visited[pos[0]][pos[1]] = 0
-                return 0
-
-            # If the cell is the right colour
-            else:
-                # Mark the board
-                visited[pos[0]][pos[1]] = 1
-
-                # The size of the blob is equal to the size of the blobs to the
-                # north, south, east, and west, plus 1
-                north_size = self._undiscovered_blob_size((pos[0] - 1, pos[1]),
-                                                          board, visited)
-                east_size = self._undiscovered_blob_size((pos[0], pos[1] + 1),
-                                                         board, visited)
-                west_size = self._undiscovered_blob_size((pos[0], pos[1] - 1),
-                                                         board, visited)
-                south_size = self._undiscovered_blob_size((pos[0] + 1, pos[1]),
-                                                          board, visited)
-
-                return north_size + east_size + west_size + south_size + 1
-
 
 class PerimeterGoal(Goal):
     """A goal to put the most possible units of this goal's target colour
@@ -156,36 +308,317 @@ class PerimeterGoal(Goal):
 
         The score is always greater than or equal to 0.
         """
-        flat_board = board.flatten()
-        board_size = len(flat_board[0])
-        
-        # Count the perimeter blocks of the target colour by looping through
-        # each side simultaneously. Corner blocks are worth double points, so
-        # are counted twice.
+        if isinstance(board, Bitboard):
+            return board.perimeter(self.colour)
+
+        # Visit only the blocks that touch the sides of the board.  Each is
+        # paired with the sides of the board it touches, as a set of bits.
         score_count = 0
-        for i in range(board_size):
-            if self.colour == flat_board[i][0]:
-                score_count += 1
-            if self.colour == flat_board[i][board_size - 1]:
-                score_count += 1
-            if self.colour == flat_board[0][i]:
-                score_count += 1
-            if self.colour == flat_board[board_size - 1][i]:
-                score_count += 1
+        stack = [(board, _ALL_SIDES)]
+        while stack:
+            block, sides = stack.pop()
+            children = block.children
+            if len(children) == 0:
+                # An undivided block adds its width for each side it is on,
+                # so corner blocks are worth double points.
+                if block.colour == self.colour:
+                    width = 2 ** (block.max_depth - block.level)
+                    score_count += width * bin(sides).count('1')
+            else:
+                for child, child_sides in zip(children, _CHILD_SIDES):
+                    if sides & child_sides:
+                        stack.append((child, sides & child_sides))
 
         return score_count
 
+    def score_batch(self, grids: 'np.ndarray') -> 'np.ndarray':
+        """Return the score for this goal on each of the boards in <grids>,
+        as described in Goal.score_batch.
+        """
+        target = self._target_cells(grids)
+        # Corner cells are on two edges, so they are counted twice
+        return target[:, 0, :].sum(axis=1) + target[:, -1, :].sum(axis=1) + \
+            target[:, :, 0].sum(axis=1) + target[:, :, -1].sum(axis=1)
+
     def description(self) -> str:
         """Return a description of this goal.
         """
         return "Surround the perimeter with this colour"
 
+
+def _transform_sides(sides: Sides, turns: int, mirrored: bool,
+                     inverse: bool) -> Sides:
+    """Return the sides of a block with sides <sides> after it is reflected
+    left to right if <mirrored>, then rotated clockwise by <turns> quarter
+    turns, or before that if <inverse> is True.
+    """
+    reverse = _reverse_side
+    north, south, west, east = sides
+    if inverse:
+        for _ in range(turns):
+            # Rotate counterclockwise by a quarter turn
+            north, south, west, east = \
+                east, west, reverse(north), reverse(south)
+    if mirrored:
+        north, south, west, east = reverse(north), reverse(south), east, west
+    if not inverse:
+        for _ in range(turns):
+            # Rotate clockwise by a quarter turn
+            north, south, west, east = \
+                reverse(west), reverse(east), south, north
+    return north, south, west, east
+
+
+def _reverse_side(side: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Return the side <side>, in the format described in _concatenate,
+    read in the opposite direction.
+    """
+    length = side[-1][0]
+    starts = [0] + [end for end, _ in side[:-1]]
+    return [(length - start, label)
+            for start, (_, label) in zip(reversed(starts), reversed(side))]
+
+
+def _relabel(side: List[Tuple[int, int]], offset: int) \
+        -> List[Tuple[int, int]]:
+    """Return the side <side> with <offset> added to each of its labels
+    other than -1.
+    """
+    if offset == 0:
+        return side
+    return [(end, label + offset if label != -1 else -1)
+            for end, label in side]
+
+
+def _join_labels(first: List[Tuple[int, int]],
+                 second: List[Tuple[int, int]], parents: List[int]) -> None:
+    """Join the blobs that touch across a shared edge, given by the sides
+    <first> and <second> that meet there, in the union-find forest
+    <parents>.
+
+    The sides are labelled with blob numbers, as in BlobGoal summaries.
+    """
+    i = 0
+    j = 0
+    while i < len(first) and j < len(second):
+        end_first, label_first = first[i]
+        end_second, label_second = second[j]
+        if label_first != -1 and label_second != -1:
+            root_first = _find(parents, label_first)
+            root_second = _find(parents, label_second)
+            if root_first != root_second:
+                parents[root_first] = root_second
+
+        # Move past whichever run ends first, or both if they end together
+        if end_first <= end_second:
+            i += 1
+        if end_second <= end_first:
+            j += 1
+
+
+def stack_boards(boards: List[Union[Block, list]]) -> 'np.ndarray':
+    """Return an (N, S, S) array of the colour indices of the unit cells of
+    each of <boards>, for use with Goal.score_batch.
+
+    Each board may be a Block, or a flattened board as returned by
+    Block.flatten.  All of the boards must have the same size in unit
+    cells.
+    """
+    if np is None:
+        raise ImportError('stack_boards requires NumPy')
+    grids = []
+    for board in boards:
+        if isinstance(board, list):
+            grids.append(np.array([[COLOUR_LIST.index(colour)
+                                    for colour in column]
+                                   for column in board], dtype=np.uint8))
+        else:
+            grids.append(board.flatten_array())
+    return np.stack(grids)
+
+
+def score_goals(board: Block, goals: List[Goal]) -> List[int]:
+    """Return the score of each of <goals> on <board>, in order.
+
+    The board is walked once for all of the BlobGoals and PerimeterGoals
+    together, as described in colour_scores.  Goals of any other type are
+    scored separately.
+    """
+    if not any(isinstance(goal, (BlobGoal, PerimeterGoal))
+               for goal in goals):
+        return [goal.score(board) for goal in goals]
+    blob_scores, perimeter_scores = colour_scores(board)
+    scores = []
+    for goal in goals:
+        if isinstance(goal, BlobGoal):
+            scores.append(blob_scores.get(goal.colour, 0))
+        elif isinstance(goal, PerimeterGoal):
+            scores.append(perimeter_scores.get(goal.colour, 0))
+        else:
+            scores.append(goal.score(board))
+    return scores
+
+
+def colour_scores(board: Block) \
+        -> Tuple[Dict[Tuple[int, int, int], int],
+                 Dict[Tuple[int, int, int], int]]:
+    """Return the scores on <board> of a BlobGoal and of a PerimeterGoal for
+    every colour in COLOUR_LIST, as two dicts from colour to score.
+
+    Both come from one walk over the board: the blobs are found as in
+    largest_blobs, and the perimeter scores are read from the undivided
+    blocks along the sides of the board that this finds.
+    """
+    colours, blob_areas, board_sides = _find_blobs(board)
+    blob_scores = {colour: 0 for colour in COLOUR_LIST}
+    for leaf, area in enumerate(blob_areas):
+        if area > blob_scores.get(colours[leaf], 0):
+            blob_scores[colours[leaf]] = area
+
+    perimeter_scores = {colour: 0 for colour in COLOUR_LIST}
+    for side in board_sides:
+        start = 0
+        for end, leaf in side:
+            perimeter_scores[colours[leaf]] = \
+                perimeter_scores.get(colours[leaf], 0) + end - start
+            start = end
+    return blob_scores, perimeter_scores
+
+
+def largest_blobs(board: Block) -> Dict[Tuple[int, int, int], int]:
+    """Return the size, in unit cells, of the largest connected blob of each
+    colour on <board>.  Colours that are not on the board are left out.
+
+    The blobs are found over the undivided blocks of the board rather than
+    over its unit cells, so a large block of one colour costs no more than
+    a unit cell.  An undivided block at level l covers 4 ** (max_depth - l)
+    unit cells.
+
+    Each block is given the list of the undivided blocks along each of its
+    four sides, built from those of its children.  Where two children meet,
+    the blocks along their shared edge are matched up, and touching blocks
+    of the same colour are joined using union-find.
+    """
+    colours, blob_areas, _ = _find_blobs(board)
+    largest = {}
+    for leaf, area in enumerate(blob_areas):
+        if area > largest.get(colours[leaf], 0):
+            largest[colours[leaf]] = area
+    return largest
+
+
+def _find_blobs(board: Block) -> Tuple[list, List[int], Sides]:
+    """Find the blobs of <board> as described in largest_blobs.
+
+    Return the colour of each undivided block of <board>, the area of the
+    blob that each undivided block is the root of in the union-find forest
+    (or 0 if it is not a root), and the sides of <board> in the format
+    described in _concatenate.
+    """
+    # For each undivided block, in the order they are found: its colour,
+    # its area, and the index of its parent in the union-find forest
+    colours = []
+    areas = []
+    parents = []
+
+    # The stack holds blocks still to be visited, paired with False, and
+    # blocks whose children have all been visited, paired with True.  The
+    # sides of visited blocks are kept in <sides>, children first.
+    sides = []
+    stack = [(board, False)]
+    while stack:
+        block, visited = stack.pop()
+        children = block.children
+        if len(children) == 0:
+            width = 2 ** (block.max_depth - block.level)
+            leaf = len(colours)
+            colours.append(block.colour)
+            areas.append(width * width)
+            parents.append(leaf)
+            edge = [(width, leaf)]
+            sides.append((edge, edge, edge, edge))
+        elif not visited:
+            stack.append((block, True))
+            stack.extend((child, False) for child in reversed(children))
+        else:
+            # The children were visited in order, so their sides are on top
+            lr, ll, ul, ur = sides.pop(), sides.pop(), sides.pop(), sides.pop()
+            colour_parents = (colours, parents)
+            _join_edges(ul[3], ur[2], colour_parents)
+            _join_edges(ll[3], lr[2], colour_parents)
+            _join_edges(ul[1], ll[0], colour_parents)
+            _join_edges(ur[1], lr[0], colour_parents)
+            sides.append((_concatenate(ul[0], ur[0]),
+                          _concatenate(ll[1], lr[1]),
+                          _concatenate(ul[2], ll[2]),
+                          _concatenate(ur[3], lr[3])))
+
+    # Add up the area of each blob
+    blob_areas = [0] * len(colours)
+    for leaf in range(len(colours)):
+        blob_areas[_find(parents, leaf)] += areas[leaf]
+    return colours, blob_areas, sides[0]
+
+
+def _concatenate(first: List[Tuple[int, int]],
+                 second: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Return the side made of the side <first> followed by the side
+    <second>.
+
+    A side is a list of the undivided blocks along one side of a block, in
+    order from top to bottom or from left to right.  Each is given as a
+    pair of the distance, in unit cells, from the start of the side to the
+    far end of the block, and the index of the block in largest_blobs.
+    """
+    offset = first[-1][0]
+    return first + [(end + offset, leaf) for end, leaf in second]
+
+
+def _join_edges(first: List[Tuple[int, int]],
+                second: List[Tuple[int, int]],
+                colour_parents: Tuple[list, List[int]]) -> None:
+    """Join the blobs of the blocks of the same colour that touch across a
+    shared edge, given by the sides <first> and <second> that meet there.
+
+    The sides are in the format described in _concatenate, and
+    <colour_parents> holds the colours and union-find parents of the
+    undivided blocks.
+    """
+    colours, parents = colour_parents
+    i = 0
+    j = 0
+    while i < len(first) and j < len(second):
+        end_first, leaf_first = first[i]
+        end_second, leaf_second = second[j]
+        if colours[leaf_first] == colours[leaf_second]:
+            root_first = _find(parents, leaf_first)
+            root_second = _find(parents, leaf_second)
+            if root_first != root_second:
+                parents[root_first] = root_second
+
+        # Move past whichever block ends first, or both if they end together
+        if end_first <= end_second:
+            i += 1
+        if end_second <= end_first:
+            j += 1
+
+
+def _find(parents: List[int], leaf: int) -> int:
+    """Return the root of <leaf> in the union-find forest <parents>,
+    halving the path to it on the way.
+    """
+    while parents[leaf] != leaf:
+        parents[leaf] = parents[parents[leaf]]
+        leaf = parents[leaf]
+    return leaf
+
+
 if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config={
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing',
-            'block', 'goal', 'player', 'renderer'
+            'block', 'bitboard', 'goal', 'player', 'renderer', 'numpy'
         ],
         'max-attributes': 15
     })
@@ -0,0 +1,633 @@
+"""Assignment 2 - Blocky
+
+=== CSC148 Fall 2017 ===
+Diane Horton and David Liu
+Department of Computer Science,
+University of Toronto
+
+
+=== Module Description ===
+
+This file contains an alternative board engine for the game.  Rather than
+one Python object per block, the whole tree is stored as a linear quadtree
+in flat arrays indexed by node id.  LinearBlock objects are lightweight
+views onto single nodes of such a tree, and provide the same public methods
+as Block, so the rest of the game can use either engine.
+"""
+from array import array
+from typing import Optional, Tuple, List, Iterable
+import random
+import math
+try:
+    import numpy as np
+except ImportError:
+    np = None
+from renderer import COLOUR_LIST
+from block import HIGHLIGHT_COLOUR, FRAME_COLOUR
+
+# The colour index stored for nodes that are subdivided.
+NO_COLOUR = 255
+
+
+class LinearQuadtree:
+    """A Blocky board stored as a linear quadtree in flat arrays.
+
+    Every node is identified by an integer id, which indexes into the
+    parallel arrays below.  The root of the board is always node 0.
+
+    === Public Attributes ===
+    max_depth:
+        The deepest level allowed in the board.
+    position:
+        The (x, y) coordinates of the upper left corner of the board.
+    size:
+        The height and width of the board.
+
+    === Private Attributes ===
+    _colour:
+        For each node, the index into COLOUR_LIST of its colour if it is
+        not subdivided, and NO_COLOUR otherwise.  This doubles as the
+        leaf flag of the node.
+    _level:
+        For each node, its level within the board.
+    _children:
+        Four entries per node, holding the ids of its children in the same
+        order as Block.children, or -1 if the node is not subdivided.
+    _parent:
+        For each node, the id of its parent, or -1 for the root.
+    _free:
+        Ids of discarded nodes which may be reused.
+    _highlighted:
+        The ids of the nodes that are currently highlighted.
+    _done:
+        The moves made on this tree that are in effect, in the format of
+        MoveJournal.done but with node ids in place of Blocks.  A smash
+        keeps the ids of the children it replaced, so they are not freed.
+    _undone:
+        The moves that have been undone and may be redone, in the format
+        of MoveJournal.undone.
+
+    === Representation Invariants ===
+    - _colour[i] == NO_COLOUR iff _children[4 * i] != -1
+    - the children of node i have level _level[i] + 1 <= max_depth
+    """
+    max_depth: int
+    position: Tuple[int, int]
+    size: int
+    _colour: bytearray
+    _level: bytearray
+    _children: array
+    _parent: array
+    _free: List[int]
+    _highlighted: set
+    _done: List[Tuple[int, str, object]]
+    _undone: List[Tuple[int, str, object]]
+
+    def __init__(self, max_depth: int) -> None:
+        """Initialize this tree to hold a single undivided root block of the
+        first colour, at position (0, 0) with size 0.
+        """
+        self.max_depth = max_depth
+        self.position = (0, 0)
+        self.size = 0
+        self._colour = bytearray()
+        self._level = bytearray()
+        self._children = array('l')
+        self._parent = array('l')
+        self._free = []
+        self._highlighted = set()
+        self._done = []
+        self._undone = []
+        self._new_node(0, 0, -1)
+
+    def root(self) -> 'LinearBlock':
+        """Return a view of the root block of this tree.
+        """
+        return LinearBlock(self, 0)
+
+    def _new_node(self, level: int, colour: int, parent: int) -> int:
+        """Return the id of a new undivided node with the given <level>,
+        <colour> index and <parent> id, reusing a discarded id if possible.
+        """
+        if self._free:
+            node = self._free.pop()
+            self._colour[node] = colour
+            self._level[node] = level
+            self._children[4 * node:4 * node + 4] = array('l', [-1] * 4)
+            self._parent[node] = parent
+        else:
+            node = len(self._colour)
+            self._colour.append(colour)
+            self._level.append(level)
+            self._children.extend([-1] * 4)
+            self._parent.append(parent)
+        return node
+
+    def _free_subtrees(self, nodes: Iterable[int]) -> None:
+        """Free each of the detached nodes <nodes> and all of their
+        descendants.  Ids of -1 are ignored.
+        """
+        stack = [node for node in nodes if node != -1]
+        while stack:
+            current = stack.pop()
+            first = self._children[4 * current]
+            if first != -1:
+                stack.extend(self._children[4 * current:4 * current + 4])
+                self._children[4 * current:4 * current + 4] = \
+                    array('l', [-1] * 4)
+            self._colour[current] = NO_COLOUR
+            self._highlighted.discard(current)
+            self._free.append(current)
+
+    def _exchange_contents(self, node: int, contents: list) -> None:
+        """Replace the children and colour index of <node> with the two
+        items of <contents>, and put the old ones into <contents> in their
+        place.
+        """
+        first = 4 * node
+        old_contents = [self._children[first:first + 4], self._colour[node]]
+        self._children[first:first + 4], self._colour[node] = contents
+        contents[:] = old_contents
+
+    def _record(self, node: int, action: str, data: object) -> None:
+        """Record that <action> was applied to <node> with <data>, and
+        forget the moves that could have been redone.
+        """
+        self._done.append((node, action, data))
+        for _, undone_action, undone_data in self._undone:
+            if undone_action == 'smash':
+                # The children given by an undone smash can never return
+                self._free_subtrees(undone_data[0])
+        self._undone.clear()
+
+    def _replay(self, move: Tuple[int, str, object], undo: bool) -> None:
+        """Make <move> again, or reverse it if <undo> is True.
+        """
+        node, action, data = move
+        if action == 'swap':
+            LinearBlock(self, node)._swap(data)
+        elif action == 'rotate':
+            LinearBlock(self, node)._rotate(4 - data if undo else data)
+        else:
+            self._exchange_contents(node, data)
+
+    def undo(self) -> bool:
+        """Undo the most recent move made on this tree, as described in
+        Block.undo.
+        """
+        if not self._done:
+            return False
+        move = self._done.pop()
+        self._replay(move, True)
+        self._undone.append(move)
+        return True
+
+    def redo(self) -> bool:
+        """Make again the move most recently undone on this tree, as
+        described in Block.redo.
+        """
+        if not self._undone:
+            return False
+        move = self._undone.pop()
+        self._replay(move, False)
+        self._done.append(move)
+        return True
+
+    def checkpoint(self) -> int:
+        """Return a checkpoint for the current state of this tree, which
+        can be passed to rollback.
+        """
+        return len(self._done)
+
+    def rollback(self, checkpoint: int) -> None:
+        """Undo every move made on this tree since <checkpoint> was
+        returned by checkpoint.
+        """
+        while len(self._done) > checkpoint:
+            self.undo()
+
+    def clear_history(self) -> None:
+        """Forget the moves made and undone so far on this tree, as
+        described in Block.clear_history.
+        """
+        for _, action, data in self._done + self._undone:
+            if action == 'smash':
+                # The children the smash replaced, or gave if it is undone,
+                # are no longer part of the tree
+                self._free_subtrees(data[0])
+        self._done.clear()
+        self._undone.clear()
+
+    def _random_fill(self, node: int) -> None:
+        """Randomly subdivide and colour the undivided node <node>, in the
+        same way, and drawing the same random numbers in the same order,
+        as block.random_init.
+        """
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            level = self._level[current]
+            subdivide_choice = random.random() \
+                if level < self.max_depth else 2
+            if subdivide_choice < math.exp(-0.25 * level):
+                self._colour[current] = NO_COLOUR
+                kids = [self._new_node(level + 1, NO_COLOUR, current)
+                        for _ in range(4)]
+                self._children[4 * current:4 * current + 4] = \
+                    array('l', kids)
+                # Push in reverse so that the children are filled in order
+                stack.extend(reversed(kids))
+            else:
+                self._colour[current] = random.randint(0, 3)
+
+    def path_to(self, node: int) -> List[int]:
+        """Return the child indices leading from the root to <node>.
+        """
+        path = []
+        parent = self._parent[node]
+        while parent != -1:
+            path.append(self._children[4 * parent:4 * parent + 4]
+                        .index(node))
+            node = parent
+            parent = self._parent[node]
+        path.reverse()
+        return path
+
+    def location_of(self, node: int) -> Tuple[Tuple[int, int], int]:
+        """Return the position and size of <node> on the screen.
+        """
+        (x, y), size = self.position, self.size
+        for index in self.path_to(node):
+            size, x, y = _child_location(index, x, y, size)
+        return (x, y), size
+
+
+def _child_location(index: int, x: int, y: int, size: int) \
+        -> Tuple[int, int, int]:
+    """Return the size and (x, y) position of the child at <index> of a
+    block at (<x>, <y>) with size <size>, as a tuple (size, x, y).
+    """
+    half = round(size / 2)
+    if index == 0:
+        return half, x + half, y
+    elif index == 1:
+        return half, x, y
+    elif index == 2:
+        return half, x, y + half
+    return half, x + half, y + half
+
+
+class LinearBlock:
+    """A view of a single block within a LinearQuadtree.
+
+    A LinearBlock stores nothing but its tree and node id, and provides
+    the same public attributes and methods as Block.  Any number of views
+    may refer to the same node; they compare equal.
+
+    === Public Attributes ===
+    tree:
+        The tree that this block belongs to.
+    node:
+        The id of this block within <tree>.
+    """
+    tree: LinearQuadtree
+    node: int
+
+    def __init__(self, tree: LinearQuadtree, node: int) -> None:
+        """Initialize this view of the block <node> within <tree>.
+        """
+        self.tree = tree
+        self.node = node
+
+    def __eq__(self, other: object) -> bool:
+        """Return whether <other> is a view of the same block as this one.
+        """
+        return isinstance(other, LinearBlock) and \
+            self.tree is other.tree and self.node == other.node
+
+    def __hash__(self) -> int:
+        """Return a hash of this view.
+        """
+        return hash((id(self.tree), self.node))
+
+    @property
+    def level(self) -> int:
+        """The level of this block."""
+        return self.tree._level[self.node]
+
+    @property
+    def max_depth(self) -> int:
+        """The deepest level allowed in the board."""
+        return self.tree.max_depth
+
+    @property
+    def colour(self) -> Optional[Tuple[int, int, int]]:
+        """The colour of this block, or None if it is subdivided."""
+        index = self.tree._colour[self.node]
+        return None if index == NO_COLOUR else COLOUR_LIST[index]
+
+    @property
+    def children(self) -> List['LinearBlock']:
+        """Views of the four children of this block, or an empty list."""
+        first = 4 * self.node
+        if self.tree._children[first] == -1:
+            return []
+        return [LinearBlock(self.tree, child)
+                for child in self.tree._children[first:first + 4]]
+
+    @property
+    def parent(self) -> Optional['LinearBlock']:
+        """A view of the parent of this block, or None for the root."""
+        parent = self.tree._parent[self.node]
+        return None if parent == -1 else LinearBlock(self.tree, parent)
+
+    @property
+    def highlighted(self) -> bool:
+        """True iff the user has selected this block for action."""
+        return self.node in self.tree._highlighted
+
+    @highlighted.setter
+    def highlighted(self, value: bool) -> None:
+        if value:
+            self.tree._highlighted.add(self.node)
+        else:
+            self.tree._highlighted.discard(self.node)
+
+    @property
+    def position(self) -> Tuple[int, int]:
+        """The (x, y) coordinates of the upper left corner of this block."""
+        return self.tree.location_of(self.node)[0]
+
+    @property
+    def size(self) -> int:
+        """The height and width of this block."""
+        return self.tree.location_of(self.node)[1]
+
+    def update_block_locations(self, top_left: Tuple[int, int],
+                               size: int) -> None:
+        """Set the position and size of the board containing this block.
+
+        The locations of all other blocks are computed from those of the
+        root when needed, so this only has an effect on the root block.
+        """
+        if self.node == 0:
+            self.tree.position = top_left
+            self.tree.size = size
+
+    def rectangles_to_draw(self) -> List[Tuple[Tuple[int, int, int],
+                                               Tuple[int, int],
+                                               Tuple[int, int],
+                                               int]]:
+        """Return a list of tuples describing all of the rectangles to be
+        drawn in order to render this block, in the format described in
+        Block.rectangles_to_draw.
+        """
+        tree = self.tree
+        rectangles = []
+        (x, y), size = tree.location_of(self.node)
+        stack = [(self.node, x, y, size)]
+        while stack:
+            node, x, y, size = stack.pop()
+            if node in tree._highlighted:
+                rectangles.append((HIGHLIGHT_COLOUR, (x, y), (size, size), 5))
+            colour = tree._colour[node]
+            if colour != NO_COLOUR:
+                rectangles.append((COLOUR_LIST[colour], (x, y),
+                                   (size, size), 0))
+                rectangles.append((FRAME_COLOUR, (x, y), (size, size), 3))
+            else:
+                for index in range(4):
+                    half, child_x, child_y = _child_location(index, x, y,
+                                                             size)
+                    stack.append((tree._children[4 * node + index],
+                                  child_x, child_y, half))
+        return rectangles
+
+    def swap(self, direction: int) -> None:
+        """Swap the child blocks of this block.
+
+        If <direction> is 1, swap vertically.  If <direction> is 0, swap
+        horizontally. If this block has no children, do nothing.
+        """
+        if self.tree._children[4 * self.node] != -1:
+            self._swap(direction)
+            self.tree._record(self.node, 'swap', direction)
+
+    def _swap(self, direction: int) -> None:
+        """Swap the child blocks of this block, which has children, without
+        recording the move.
+        """
+        children = self.tree._children
+        first = 4 * self.node
+        a, b, c, d = children[first:first + 4]
+        if direction == 0:
+            children[first:first + 4] = array('l', [b, a, d, c])
+        else:
+            children[first:first + 4] = array('l', [d, c, b, a])
+
+    def rotate(self, direction: int) -> None:
+        """Rotate this block and all its descendants.
+
+        If <direction> is 1, rotate clockwise.  If <direction> is 3, rotate
+        counterclockwise. If this block has no children, do nothing.
+        """
+        if self.tree._children[4 * self.node] != -1 and direction in (1, 3):
+            self._rotate(direction)
+            self.tree._record(self.node, 'rotate', direction)
+
+    def _rotate(self, direction: int) -> None:
+        """Rotate this block and all its descendants without recording the
+        move.
+        """
+        children = self.tree._children
+        stack = [self.node]
+        while stack:
+            first = 4 * stack.pop()
+            if children[first] == -1:
+                continue
+            a, b, c, d = children[first:first + 4]
+            if direction == 1:
+                children[first:first + 4] = array('l', [b, c, d, a])
+            elif direction == 3:
+                children[first:first + 4] = array('l', [d, a, b, c])
+            stack.extend((a, b, c, d))
+
+    def smash(self) -> bool:
+        """Smash this block, as described in Block.smash.
+
+        Return True if this block was smashed and False otherwise.
+        """
+        tree = self.tree
+        level = tree._level[self.node]
+        if 0 < level < tree.max_depth:
+            kids = [tree._new_node(level + 1, NO_COLOUR, self.node)
+                    for _ in range(4)]
+            for kid in kids:
+                tree._random_fill(kid)
+            contents = [array('l', kids), NO_COLOUR]
+            tree._exchange_contents(self.node, contents)
+            tree._record(self.node, 'smash', contents)
+            return True
+        return False
+
+    def undo(self) -> bool:
+        """Undo the most recent move made on the tree of this block, as
+        described in Block.undo.
+        """
+        return self.tree.undo()
+
+    def redo(self) -> bool:
+        """Make again the move most recently undone on the tree of this
+        block, as described in Block.redo.
+        """
+        return self.tree.redo()
+
+    def checkpoint(self) -> int:
+        """Return a checkpoint for the current state of the tree of this
+        block, as described in Block.checkpoint.
+        """
+        return self.tree.checkpoint()
+
+    def rollback(self, checkpoint: int) -> None:
+        """Undo every move made on the tree of this block since
+        <checkpoint>, as described in Block.rollback.
+        """
+        self.tree.rollback(checkpoint)
+
+    def clear_history(self) -> None:
+        """Forget the moves made and undone so far on the tree of this
+        block, as described in Block.clear_history.
+        """
+        self.tree.clear_history()
+
+    def get_selected_block(self, location: Tuple[int, int], level: int) \
+            -> 'LinearBlock':
+        """Return the block within this block that includes the given
+        location and is at the given level, as described in
+        Block.get_selected_block.
+        """
+        tree = self.tree
+        node = self.node
+        (x, y), size = tree.location_of(node)
+        while True:
+            if tree._level[node] == level and \
+                    [x, y] <= list(location) < [x + size, y + size]:
+                break
+            if tree._children[4 * node] == -1:
+                break
+            half = round(size / 2)
+            if location[0] < x + half:
+                index = 1 if location[1] < y + half else 2
+            else:
+                index = 0 if location[1] < y + half else 3
+            node = tree._children[4 * node + index]
+            size, x, y = _child_location(index, x, y, size)
+        return LinearBlock(tree, node)
+
+    def get_selected_blocks(self, queries: Iterable[Tuple[int, int, int]]) \
+            -> List['LinearBlock']:
+        """Return the blocks that get_selected_block would return for each
+        of the (x, y, level) triples in <queries>, in order.
+
+        <queries> may also be a NumPy array with three columns.
+        """
+        if np is not None and isinstance(queries, np.ndarray):
+            queries = queries.tolist()
+        return [self.get_selected_block((x, y), level)
+                for x, y, level in queries]
+
+    def flatten(self) -> List[List[Tuple[int, int, int]]]:
+        """Return a two-dimensional list representing this block as rows
+        and columns of unit cells, as described in Block.flatten.
+        """
+        tree = self.tree
+        cells = 2 ** (tree.max_depth - tree._level[self.node])
+        grid = [[None] * cells for _ in range(cells)]
+        stack = [(self.node, 0, 0, cells)]
+        while stack:
+            node, x, y, cells = stack.pop()
+            colour = tree._colour[node]
+            if colour != NO_COLOUR:
+                column = [COLOUR_LIST[colour]] * cells
+                for i in range(x, x + cells):
+                    grid[i][y:y + cells] = column
+            else:
+                half = cells // 2
+                kids = tree._children[4 * node:4 * node + 4]
+                stack.append((kids[0], x + half, y, half))
+                stack.append((kids[1], x, y, half))
+                stack.append((kids[2], x, y + half, half))
+                stack.append((kids[3], x + half, y + half, half))
+        return grid
+
+    def flatten_array(self) -> 'np.ndarray':
+        """Return a two-dimensional NumPy array of colour indices
+        representing this block, as described in Block.flatten_array.
+
+        Raise ImportError if NumPy is not installed.
+        """
+        if np is None:
+            raise ImportError('flatten_array requires NumPy')
+        tree = self.tree
+        cells = 2 ** (tree.max_depth - tree._level[self.node])
+        grid = np.empty((cells, cells), dtype=np.uint8)
+        stack = [(self.node, 0, 0, cells)]
+        while stack:
+            node, x, y, cells = stack.pop()
+            colour = tree._colour[node]
+            if colour != NO_COLOUR:
+                grid[x:x + cells, y:y + cells] = colour
+            else:
+                half = cells // 2
+                kids = tree._children[4 * node:4 * node + 4]
+                stack.append((kids[0], x + half, y, half))
+                stack.append((kids[1], x, y, half))
+                stack.append((kids[2], x, y + half, half))
+                stack.append((kids[3], x + half, y + half, half))
+        return grid
+
+
+def linear_random_init(max_depth: int) -> LinearBlock:
+    """Return the root of a randomly-generated LinearQuadtree subdivided to
+    a maximum depth of <max_depth>.
+
+    The board is generated in the same way as block.random_init, so for
+    the same state of the random module both produce the same board.  Its
+    position and size can be set using update_block_locations.
+    """
+    tree = LinearQuadtree(max_depth)
+    tree._random_fill(0)
+    return tree.root()
+
+
+def linear_from_block(block: 'Block') -> LinearBlock:
+    """Return the root of a LinearQuadtree with the same structure, colours
+    and location as the root Block <block>.
+    """
+    tree = LinearQuadtree(block.max_depth)
+    tree.position = block.position
+    tree.size = block.size
+    stack = [(block, 0)]
+    while stack:
+        current, node = stack.pop()
+        if len(current.children) == 0:
+            tree._colour[node] = COLOUR_LIST.index(current.colour)
+        else:
+            tree._colour[node] = NO_COLOUR
+            kids = [tree._new_node(current.level + 1, NO_COLOUR, node)
+                    for _ in range(4)]
+            tree._children[4 * node:4 * node + 4] = array('l', kids)
+            stack.extend(zip(current.children, kids))
+    return tree.root()
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'random', 'typing',
+            'block', 'goal', 'player', 'renderer', 'math', 'array',
+            'numpy'
+        ],
+        'max-attributes': 15
+    })
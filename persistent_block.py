@@ -0,0 +1,246 @@
+"""Assignment 2 - Blocky
+
+=== CSC148 Fall 2017 ===
+Diane Horton and David Liu
+Department of Computer Science,
+University of Toronto
+
+
+=== Module Description ===
+
+This file contains the PersistentBlock class, an immutable version of Block.
+
+Moves on a PersistentBlock do not change it.  Instead they return a new root
+block that shares every unchanged sub block with the old one, so only the
+blocks on the path from the root to the moved block are copied.  This makes
+a snapshot of a board cheap to take and safe to hand to other threads or
+search algorithms.
+
+Blocks within a PersistentBlock are identified by their path: the sequence
+of indices into children that leads to them from the root.
+"""
+from typing import Callable, Optional, Tuple, List
+from block import Block, random_init
+
+Path = Tuple[int, ...]
+
+
+class PersistentBlock:
+    """An immutable square block in the Blocky game.
+
+    None of the attributes of a PersistentBlock may be changed once it has
+    been created.
+
+    === Public Attributes ===
+    colour:
+        If this block is not subdivided, <colour> stores its colour.
+        Otherwise, <colour> is None.
+    level:
+        The level of this block within the overall block structure.
+    max_depth:
+        The deepest level allowed in the overall block structure.
+    children:
+        The blocks into which this block is subdivided, in the same order
+        as Block.children.
+
+    === Representation Invariants ===
+    - len(children) == 0 or len(children) == 4
+    - This block has no children iff its colour is not None
+    - _orientation == 0 if this block has no children
+    """
+    # === Private Attributes ===
+    # _children:
+    #     The sub blocks of this block, before the rotation <_orientation>
+    #     is applied to them.
+    # _orientation:
+    #     The number of clockwise quarter turns by which this block is
+    #     rotated relative to <_children>.  This lets a rotation share every
+    #     sub block of the rotated block.
+    # _flat:
+    #     The flattened representation of this block, once computed.
+    colour: Optional[Tuple[int, int, int]]
+    level: int
+    max_depth: int
+    _children: Tuple['PersistentBlock', ...]
+    _orientation: int
+    _flat: Optional[List[List[Tuple[int, int, int]]]]
+
+    def __init__(self, level: int, max_depth: int,
+                 colour: Optional[Tuple[int, int, int]] = None,
+                 children: Tuple['PersistentBlock', ...] = (),
+                 orientation: int = 0) -> None:
+        """Initialize this block with the given <level>, <max_depth>,
+        <colour> and <children>, rotated clockwise by <orientation> quarter
+        turns.
+        """
+        self.colour = colour
+        self.level = level
+        self.max_depth = max_depth
+        self._children = children
+        self._orientation = orientation % 4 if children else 0
+        self._flat = None
+
+    @property
+    def children(self) -> Tuple['PersistentBlock', ...]:
+        """The sub blocks of this block, in the order described above.
+        """
+        turns = self._orientation
+        if turns == 0:
+            return self._children
+        rotated = self._children[turns:] + self._children[:turns]
+        return tuple(child._rotated(turns) for child in rotated)
+
+    def _rotated(self, turns: int) -> 'PersistentBlock':
+        """Return this block rotated clockwise by <turns> quarter turns.
+        """
+        if not self._children or turns % 4 == 0:
+            return self
+        return PersistentBlock(self.level, self.max_depth, None,
+                               self._children, self._orientation + turns)
+
+    def get_block(self, path: Path) -> 'PersistentBlock':
+        """Return the block at <path> within this block.
+        """
+        block = self
+        for index in path:
+            block = block.children[index]
+        return block
+
+    def path_at(self, location: Tuple[int, int], level: int,
+                top_left: Tuple[int, int], size: int) -> Path:
+        """Return the path of the block that Block.get_selected_block would
+        return for <location> and <level>, if this block were at <top_left>
+        with the given <size>.
+        """
+        path = []
+        block = self
+        x, y = top_left
+        while True:
+            if block.level == level and \
+                    [x, y] <= list(location) < [x + size, y + size]:
+                break
+            children = block.children
+            if len(children) == 0:
+                break
+            size = round(size / 2)
+            if location[0] < x + size:
+                index = 1 if location[1] < y + size else 2
+            else:
+                index = 0 if location[1] < y + size else 3
+            if index in (0, 3):
+                x += size
+            if index in (2, 3):
+                y += size
+            path.append(index)
+            block = children[index]
+        return tuple(path)
+
+    def _replace(self, path: Path,
+                 change: Callable[['PersistentBlock'], 'PersistentBlock']) \
+            -> 'PersistentBlock':
+        """Return a copy of this block in which the block at <path> has been
+        replaced by the result of calling <change> on it.
+
+        Only the blocks along <path> are copied.
+        """
+        if len(path) == 0:
+            return change(self)
+        children = list(self.children)
+        children[path[0]] = children[path[0]]._replace(path[1:], change)
+        return PersistentBlock(self.level, self.max_depth, None,
+                               tuple(children))
+
+    def swap(self, path: Path, direction: int) -> 'PersistentBlock':
+        """Return this board after swapping the children of the block at
+        <path>, as described in Block.swap.
+        """
+        def change(block: PersistentBlock) -> PersistentBlock:
+            children = block.children
+            if len(children) == 0:
+                return block
+            if direction == 0:
+                order = (1, 0, 3, 2)
+            else:
+                order = (3, 2, 1, 0)
+            return PersistentBlock(block.level, block.max_depth, None,
+                                   tuple(children[i] for i in order))
+        return self._replace(path, change)
+
+    def rotate(self, path: Path, direction: int) -> 'PersistentBlock':
+        """Return this board after rotating the block at <path>, as
+        described in Block.rotate.
+
+        This copies only the blocks along <path>.
+        """
+        if direction not in (1, 3):
+            return self
+        return self._replace(path, lambda block: block._rotated(direction))
+
+    def smash(self, path: Path) -> 'PersistentBlock':
+        """Return this board after smashing the block at <path>, as
+        described in Block.smash.
+
+        If that block cannot be smashed, return this board unchanged.  The
+        new sub blocks are drawn from the random module in the same way as
+        in Block.smash.
+        """
+        target = self.get_block(path)
+        if not 0 < target.level < target.max_depth:
+            return self
+
+        def change(block: PersistentBlock) -> PersistentBlock:
+            children = tuple(freeze(random_init(block.level + 1,
+                                                block.max_depth))
+                             for _ in range(4))
+            return PersistentBlock(block.level, block.max_depth, None,
+                                   children)
+        return self._replace(path, change)
+
+    def flatten(self) -> List[List[Tuple[int, int, int]]]:
+        """Return a two-dimensional list representing this block as rows
+        and columns of unit cells, as described in Block.flatten.
+
+        The result is cached and shared, so it must not be mutated.
+        """
+        if self._flat is None:
+            if self.colour:
+                cells = 2 ** (self.max_depth - self.level)
+                self._flat = [[self.colour] * cells for _ in range(cells)]
+            else:
+                children = self.children
+                top_half = children[1].flatten() + children[0].flatten()
+                bottom_half = children[2].flatten() + children[3].flatten()
+                self._flat = [top_half[i] + bottom_half[i]
+                              for i in range(len(top_half))]
+        return self._flat
+
+    def to_block(self) -> Block:
+        """Return a new mutable Block with the same structure and colours as
+        this block.  Its position and size can be set using
+        update_block_locations.
+        """
+        block = Block(self.level, self.colour,
+                      [child.to_block() for child in self.children])
+        block.max_depth = self.max_depth
+        return block
+
+
+def freeze(block: Block) -> PersistentBlock:
+    """Return a PersistentBlock with the same structure and colours as
+    <block>.
+    """
+    if len(block.children) == 0:
+        return PersistentBlock(block.level, block.max_depth, block.colour)
+    return PersistentBlock(block.level, block.max_depth, None,
+                           tuple(freeze(child) for child in block.children))
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'random', 'typing',
+            'block', 'renderer'
+        ],
+        'max-attributes': 15
+    })
@@ -12,14 +12,25 @@ This file contains the player class hierarchy.
 """
 
 import random
-from typing import Optional, Tuple
+import multiprocessing
+from typing import Optional, Tuple, List
 import pygame
 from renderer import Renderer
 from block import Block
 from goal import Goal
+import board_io
 
 TIME_DELAY = 600
 
+# The worker pools used by SmartPlayers, keyed by their number of processes.
+# They are kept for the rest of the program, so that later turns and games
+# do not have to start new processes.
+_POOLS = {}
+
+# The goals that a worker process has scored moves for, keyed by their type
+# and colour, so that their caches are reused from one turn to the next.
+_WORKER_GOALS = {}
+
 
 class Player:
     """A player in the Blocky game.
@@ -229,17 +240,7 @@ class RandomPlayer(Player):
         pygame.time.wait(TIME_DELAY)
 
         # Randomly apply one of the five actions
-        move_choice = random.randint(1, 5)
-        if move_choice == 1:
-            block.swap(1)
-        elif move_choice == 2:
-            block.swap(0)
-        elif move_choice == 3:
-            block.rotate(1)
-        elif move_choice == 4:
-            block.rotate(3)
-        else:
-            block.smash()
+        _apply_move(block, random.randint(1, 5))
 
         # Un-highlight the block and render the board.
         block.highlighted = False
@@ -250,25 +251,34 @@ class RandomPlayer(Player):
 class SmartPlayer(Player):
     """A smart player.
 
-    Randomly chooses moves intelligently. Generates a set of random moves,
-    then compares the resulting score of each move and performs the move that
-    results in the highest score. Cannot smash.
+    Randomly chooses moves intelligently. Picks a set of distinct moves that
+    change the board, then compares the resulting score of each move and
+    performs the move that results in the highest score. Cannot smash.
 
     === Public Attributes ===
     difficulty:
         the difficulty level of this player
+    workers:
+        the number of processes that score the moves this player tries.
+        If it is more than 1, the moves are split between a pool of worker
+        processes, each scoring its share on its own copy of the board.
 
     === Representation Invariants ===
     difficulty >= 0
+    workers >= 1
     """
+    difficulty: int
+    workers: int
+
     def __init__(self, renderer: Renderer, player_id: int, goal: Goal) -> None:
         """Initialize this SmartPlayer with the given <renderer>, <player_id>
         and <goal>.
 
-        Difficulty set to 0 by default.
+        Difficulty set to 0 and workers set to 1 by default.
         """
         super().__init__(renderer, player_id, goal)
         self.difficulty = 0
+        self.workers = 1
 
     def make_move(self, board: Block) -> int:
         """Choose the best move from a list of randomly generated moves and
@@ -276,26 +286,18 @@ class SmartPlayer(Player):
 
         Return 0 to indicate the successful completion of a move.
         """
-        # Generate a list of random moves
+        # Generate a list of distinct moves
         moves = self._generate_moves(board)
 
-        # Apply each move to the board and score the board without rendering
+        # Score the board after each move, without rendering
+        if self.workers > 1 and len(moves) > 0:
+            scores = self._score_moves_in_parallel(board, moves)
+        else:
+            scores = [_score_move(board, self.goal, move) for move in moves]
+
         best_score = 0
         best_move = None
-        for move in moves:
-            # Apply the chosen move on the chosen block
-            if move[1] == 1:
-                move[0].swap(1)
-            elif move[1] == 2:
-                move[0].swap(0)
-            elif move[1] == 3:
-                move[0].rotate(1)
-            else:
-                move[0].rotate(3)
-
-            # Score the board
-            score = self.goal.score(board)
-
+        for move, score in zip(moves, scores):
             # If necessary update best_score and best_move
             if best_score <= score:
                 # It uses <= to prevent no move from being played in the event
@@ -303,15 +305,9 @@ class SmartPlayer(Player):
                 best_score = score
                 best_move = move
 
-            # Undo the move
-            if move[1] == 1:
-                move[0].swap(1)
-            elif move[1] == 2:
-                move[0].swap(0)
-            elif move[1] == 3:
-                move[0].rotate(3)
-            else:
-                move[0].rotate(1)
+        # If no move changes the board, pass
+        if best_move is None:
+            return 0
 
         # Highlight the block of the chosen move, render the board
         best_move[0].highlighted = True
@@ -321,14 +317,7 @@ class SmartPlayer(Player):
         pygame.time.wait(TIME_DELAY)
 
         # Apply the move
-        if best_move[1] == 1:
-            best_move[0].swap(1)
-        elif best_move[1] == 2:
-            best_move[0].swap(0)
-        elif best_move[1] == 3:
-            best_move[0].rotate(1)
-        else:
-            best_move[0].rotate(3)
+        _apply_move(best_move[0], best_move[1])
 
         # Un-highlight the block and render the board
         best_move[0].highlighted = False
@@ -336,13 +325,40 @@ class SmartPlayer(Player):
 
         return 0
 
-    def _generate_moves(self, board: Block) -> Tuple[Block, int]:
+    def _score_moves_in_parallel(self, board: Block,
+                                 moves: List[Tuple[Block, int]]) -> List[int]:
+        """Return the score of this player's goal on <board> after each of
+        <moves>, scoring them in a pool of worker processes.
+
+        The board is sent to the workers in the format of board_io.dump,
+        and each move as the path to its block from the root and its
+        action.  The moves are split into one contiguous share for each
+        worker, so the scores come back in the same order as <moves>.
+        """
+        record = board_io.dump(board)
+        tasks = []
+        share = -(-len(moves) // self.workers)
+        for start in range(0, len(moves), share):
+            tasks.append((record, type(self.goal), self.goal.colour,
+                          [(_block_path(block), move_choice)
+                           for block, move_choice in
+                           moves[start:start + share]]))
+        scores = []
+        for task_scores in _get_pool(self.workers).map(_score_moves_task,
+                                                       tasks):
+            scores.extend(task_scores)
+        return scores
+
+    def _generate_moves(self, board: Block) -> List[Tuple[Block, int]]:
         """Generate a list of moves for this player to try on the given board.
 
         Moves are represented by a tuple containing a block and an int
-        corresponding to the action of choice.
+        corresponding to the action of choice.  The moves are chosen at
+        random from all of the distinct moves that change the board, and
+        all of them are tried if there are no more than the difficulty
+        allows.
         """
-        # Determine the number of moves to generate based on the difficulty
+        # Determine the number of moves to try based on the difficulty
         if self.difficulty == 0:
             num_moves = 5
         elif self.difficulty == 1:
@@ -356,31 +372,157 @@ class SmartPlayer(Player):
         else:
             num_moves = 150
 
-        moves = []
-        for _ in range(num_moves):
-            # Choose a random block
-            random_location = (random.randint(0, board.size), \
-                               random.randint(0, board.size))
-            random_depth = random.randint(0, board.max_depth)
-            random_block = board.get_selected_block(random_location,
-                                                    random_depth)
+        moves = _enumerate_moves(board)
+        if len(moves) > num_moves:
+            moves = random.sample(moves, num_moves)
+        return moves
 
-            # Choose a random action
-            move_choice = random.randint(1, 4)
 
-            # Add the move to the list of moves.
-            move = (random_block, move_choice)
-            moves.append(move)
+def _enumerate_moves(board: Block) -> List[Tuple[Block, int]]:
+    """Return every distinct move, other than a smash, that changes <board>,
+    as pairs of a block and an action numbered as in _apply_move.
+
+    Undivided blocks are skipped, since swapping or rotating them does
+    nothing.  So is any move that leaves its block the same as it was, or
+    the same as an earlier move on that block does, such as either swap of
+    a block whose children are all the same.  The blocks are listed from
+    the top of the board down.
+    """
+    moves = []
+    stack = [board]
+    while stack:
+        block = stack.pop()
+        if len(block.children) == 0:
+            continue
+
+        # Try each action on the block, and compare what it becomes
+        seen = {_contents_key(block)}
+        for move_choice in range(1, 5):
+            checkpoint = board.checkpoint()
+            _apply_move(block, move_choice)
+            key = _contents_key(block)
+            board.rollback(checkpoint)
+            if key not in seen:
+                seen.add(key)
+                moves.append((block, move_choice))
+        stack.extend(reversed(block.children))
+    return moves
+
+
+def _contents_key(block: Block) -> object:
+    """Return a value that is the same for two blocks at the same level iff
+    each of their unit cells has the same colour.
+
+    Blocks and LinearBlocks give the same value for the same colours, so
+    both engines find the same moves.
+    """
+    try:
+        return block.flatten_array().tobytes()
+    except ImportError:
+        return tuple(tuple(column) for column in block.flatten())
+
+
+def _score_move(board: Block, goal: Goal, move: Tuple[Block, int]) -> int:
+    """Return the score of <goal> on <board> after <move>, leaving <board>
+    as it was.
+    """
+    # Apply the chosen move on the chosen block
+    checkpoint = board.checkpoint()
+    _apply_move(move[0], move[1])
+
+    # Score the board
+    score = goal.score(board)
+
+    # Undo the move
+    board.rollback(checkpoint)
+    return score
+
+
+def _block_path(block: Block) -> List[int]:
+    """Return the indices in the children of each of its ancestors that lead
+    from the root of the board down to <block>.
+    """
+    path = []
+    parent = block.parent
+    while parent is not None:
+        path.append(parent.children.index(block))
+        block, parent = parent, parent.parent
+    path.reverse()
+    return path
+
+
+def _get_pool(processes: int) -> 'multiprocessing.pool.Pool':
+    """Return a pool of <processes> worker processes, starting it if there
+    is not one already.
+    """
+    pool = _POOLS.get(processes)
+    if pool is None:
+        pool = multiprocessing.Pool(processes)
+        _POOLS[processes] = pool
+    return pool
+
+
+def close_pools() -> None:
+    """Shut down the worker pools used by SmartPlayers.
+
+    A new pool is started if a SmartPlayer needs one again.
+    """
+    for pool in _POOLS.values():
+        pool.close()
+        pool.join()
+    _POOLS.clear()
+
+
+def _score_moves_task(task: Tuple[bytes, type, Tuple[int, int, int],
+                                  List[Tuple[List[int], int]]]) -> List[int]:
+    """Return the scores of a share of a SmartPlayer's moves, in a worker
+    process.
+
+    <task> holds the board in the format of board_io.dump, the type and
+    colour of the goal, and the moves, each as the path to its block and
+    its action.
+    """
+    record, goal_type, colour, moves = task
+    board = board_io.load(record)
+    goal = _WORKER_GOALS.get((goal_type, colour))
+    if goal is None:
+        goal = goal_type(colour)
+        _WORKER_GOALS[(goal_type, colour)] = goal
+
+    scores = []
+    for path, move_choice in moves:
+        block = board
+        for index in path:
+            block = block.children[index]
+        scores.append(_score_move(board, goal, (block, move_choice)))
+    return scores
+
+
+def _apply_move(block: Block, move_choice: int) -> None:
+    """Apply the action numbered <move_choice> to <block>.
+
+    The actions are 1: swap vertically, 2: swap horizontally, 3: rotate
+    clockwise, 4: rotate counterclockwise and 5: smash.
+    """
+    if move_choice == 1:
+        block.swap(1)
+    elif move_choice == 2:
+        block.swap(0)
+    elif move_choice == 3:
+        block.rotate(1)
+    elif move_choice == 4:
+        block.rotate(3)
+    else:
+        block.smash()
 
-        return moves
 
 if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config={
         'allowed-io': ['process_event'],
         'allowed-import-modules': [
-            'doctest', 'python_ta', 'random', 'typing',
-            'block', 'goal', 'player', 'renderer',
+            'doctest', 'python_ta', 'random', 'typing', 'multiprocessing',
+            'block', 'board_io', 'goal', 'player', 'renderer',
             'pygame'
         ],
         'max-attributes': 10,
@@ -12,11 +12,12 @@ This file contains some sample tests for Assignment 2.
 Please use this as a starting point to check your work and write your own
 tests!
 """
-from typing import List, Tuple
+from typing import List, Tuple, Iterator
 from renderer import COLOUR_LIST
 from block import Block
 from goal import PerimeterGoal, BlobGoal
 from game import Game
+from linear_block import linear_random_init, linear_from_block
 
 
 def test_flatten() -> None:
@@ -136,6 +137,225 @@ def test_get_selected_block():
     assert board.get_selected_block((100, 10), 0) is not None
 
 
+def test_get_selected_blocks() -> None:
+    """Test that the batch locator agrees with get_selected_block on the
+    original board layout, including for locations off the board and after
+    rotations that are still pending.
+    """
+    import random
+    from block import generate_board
+    board, _ = construct_board()
+    board.update_block_locations((0, 0), 50)
+    assert board.morton_path((40, 10), 2) == (0b1010, 2)
+    assert board.morton_path((40, 10), 1) == (0b10, 1)
+    assert board.morton_path((10, 40), 2) == (0b01, 1)
+
+    board = generate_board(6, 750, random.Random(2))
+    linear = linear_from_block(board)
+    board.children[2].rotate(1)
+    linear.children[2].rotate(1)
+    rng = random.Random(9)
+    queries = [(rng.randint(-5, 755), rng.randint(-5, 755), rng.randint(0, 6))
+               for _ in range(500)]
+    expected = linear.get_selected_blocks(queries)
+    for block, view, (x, y, level) in zip(board.get_selected_blocks(queries),
+                                          expected, queries):
+        assert block is board.get_selected_block((x, y), level)
+        assert (block.position, block.size, block.level) == \
+            (view.position, view.size, view.level)
+
+
+def test_rectangle_cache() -> None:
+    """Test that the cached rectangles stay correct as moves are made, and
+    that highlighting a block does not throw the cache away.
+    """
+    import random
+    from block import generate_board, HIGHLIGHT_COLOUR
+    board = generate_board(5, 320, random.Random(4))
+    rng = random.Random(5)
+    for _ in range(40):
+        block = board.get_selected_block((rng.randint(0, 320),
+                                          rng.randint(0, 320)),
+                                         rng.randint(0, 5))
+        action = rng.randint(1, 5)
+        if action <= 2:
+            block.swap(action - 1)
+        elif action <= 4:
+            block.rotate(2 * action - 5)
+        else:
+            block.smash()
+        expected = linear_from_block(board)
+        expected.update_block_locations((0, 0), 320)
+        assert sorted(board.rectangles_to_draw()) == \
+            sorted(expected.rectangles_to_draw())
+
+    cached = board._rectangles
+    block = board.get_selected_block((100, 200), 2)
+    block.highlighted = True
+    frame = (HIGHLIGHT_COLOUR, block.position, (block.size, block.size), 5)
+    assert frame in board.rectangles_to_draw()
+    assert frame in block.rectangles_to_draw()
+    assert frame not in board.children[0].rectangles_to_draw()
+    block.highlighted = False
+    assert frame not in board.rectangles_to_draw()
+    assert board._rectangles is cached
+
+
+def test_move_journal() -> None:
+    """Test that moves, including smashes, can be undone and redone on
+    both engines, and that a new move discards the moves that were undone.
+    """
+    import random
+    from block import generate_board
+    board = generate_board(4, 160, random.Random(6))
+    linear = linear_from_block(board)
+    assert not board.undo()
+    rng = random.Random(7)
+    snapshots = {board.checkpoint(): board.flatten()}
+    for _ in range(30):
+        location = (rng.randint(0, 160), rng.randint(0, 160))
+        level = rng.randint(0, 4)
+        action = rng.randint(1, 5)
+        state = random.getstate()
+        for engine in (board, linear):
+            random.setstate(state)
+            block = engine.get_selected_block(location, level)
+            if action <= 2:
+                block.swap(action - 1)
+            elif action <= 4:
+                block.rotate(2 * action - 5)
+            else:
+                block.smash()
+        assert linear.checkpoint() == board.checkpoint()
+        assert linear.flatten() == board.flatten()
+        snapshots[board.checkpoint()] = board.flatten()
+
+    end = board.checkpoint()
+    for engine in (board, linear):
+        engine.rollback(0)
+        assert engine.flatten() == snapshots[0]
+        while engine.redo():
+            pass
+        assert engine.flatten() == snapshots[end]
+        engine.rollback(end - 10)
+        assert engine.flatten() == snapshots[end - 10]
+
+    # A new move means the undone moves can no longer be redone
+    board.children[0].swap(0)
+    assert not board.redo()
+    board.undo()
+    assert board.flatten() == linear.flatten()
+
+    # Moves can be undone from any block of the board
+    for engine in (board, linear):
+        engine.children[0].swap(1)
+        assert engine.children[2].undo()
+        assert engine.children[2].redo()
+    assert board.flatten() == linear.flatten()
+
+    # Clearing the history frees the subtrees replaced by smashes
+    state = random.getstate()
+    for engine in (board, linear):
+        random.setstate(state)
+        assert engine.children[1].smash() and engine.children[1].smash()
+    free = len(linear.tree._free)
+    for engine in (board, linear):
+        engine.children[3].clear_history()
+        assert not engine.undo() and not engine.redo()
+        assert engine.checkpoint() == 0
+    assert len(linear.tree._free) > free
+    assert board.flatten() == linear.flatten()
+
+
+def test_compact_blocks() -> None:
+    """Test that blocks have no __dict__, store their colour as a palette
+    index, and do not keep their parents alive.
+    """
+    board, _ = construct_board()
+    assert not hasattr(board, '__dict__')
+    leaf = board.children[2]
+    assert leaf.colour == COLOUR_LIST[1]
+    assert leaf._colour == 1
+    leaf.colour = (1, 2, 3)
+    assert leaf.colour == (1, 2, 3)
+    assert leaf.parent is board
+    del board
+    assert leaf.parent is None
+
+    # Undivided blocks refuse changes to their shared empty children
+    try:
+        leaf.children.append(Block(2, COLOUR_LIST[0]))
+    except TypeError:
+        pass
+    else:
+        assert False, 'changed the children of an undivided block'
+    assert leaf.children == [] and Block(1).children == []
+    leaf.children = [Block(2, COLOUR_LIST[0]) for _ in range(4)]
+    assert len(leaf.children) == 4
+
+
+def test_canonical_form() -> None:
+    """Test that every rotation and reflection of a board has the same
+    canonical hash and canonical form, and that other boards do not.
+    """
+    import random
+    from block import generate_board, canonical_form
+    board = generate_board(5, 320, random.Random(8))
+    expected = canonical_form(board)
+    assert expected.board_hash() == board.canonical_hash()
+    for mirrored in (False, True):
+        for turns in range(4):
+            other = generate_board(5, 320, random.Random(8))
+            if mirrored:
+                # Reflect left to right by swapping every block horizontally
+                stack = [other]
+                while stack:
+                    block = stack.pop()
+                    block.swap(0)
+                    stack.extend(block.children)
+            for _ in range(turns):
+                other.rotate(1)
+            assert other.canonical_hash() == board.canonical_hash()
+            assert canonical_form(other).flatten() == expected.flatten()
+    other = generate_board(5, 320, random.Random(9))
+    assert other.canonical_hash() != board.canonical_hash()
+
+
+def test_board_diff() -> None:
+    """Test that diff reports the parts of a board changed by a move, and
+    nothing for identical boards.
+    """
+    import random
+    from block import generate_board
+    from board_io import dump, load
+    from board_diff import diff
+    from persistent_block import freeze
+    before = generate_board(5, 320, random.Random(10))
+    after = load(dump(before))
+    after.update_block_locations((0, 0), 320)
+    assert diff(before, after) == []
+
+    after.children[0].rotate(1)
+    changes = diff(before, after)
+    assert 0 < len(changes)
+    old_grid = before.flatten()
+    new_grid = after.flatten()
+    for i in range(32):
+        for j in range(32):
+            if old_grid[i][j] != new_grid[i][j]:
+                # Cells are 10 pixels wide
+                assert any(x <= 10 * i < x + size and y <= 10 * j < y + size
+                           for _, _, (x, y), size in changes)
+    for _, block, (x, y), size in changes:
+        assert 160 <= x and y < 160 and block.size == size
+
+    persistent = freeze(before)
+    swapped = persistent.swap((0, 0), 1)
+    changes = diff(persistent, swapped, (0, 0), 320)
+    assert 0 < len(changes)
+    assert all(240 <= x and y < 80 for _, _, (x, y), _ in changes)
+
+
 def test_swap():
     """Test the swapping of blocks in the tree.
 
@@ -224,6 +444,79 @@ def test_smash():
     assert not equal_boards(board, ref_board),\
         'A legal smash changed nothing; unlikely, but not necessarily an error'
 
+def test_enumerate_moves() -> None:
+    """Test that the moves a SmartPlayer chooses from are all distinct and
+    all change the board.
+    """
+    import random
+    from block import generate_board
+    from player import SmartPlayer, _enumerate_moves, _apply_move
+    board = generate_board(3, 320, random.Random(3))
+    board.children[2].smash()
+    before = board.board_hash()
+    moves = _enumerate_moves(board)
+    assert board.board_hash() == before
+
+    results = set()
+    for block, move_choice in moves:
+        assert len(block.children) == 4
+        checkpoint = board.checkpoint()
+        _apply_move(block, move_choice)
+        results.add(board.board_hash())
+        board.rollback(checkpoint)
+    assert len(results) == len(moves)
+    assert before not in results
+
+    # Both swaps of a block with uniform children do nothing
+    uniform = Block(0, children=[Block(1, COLOUR_LIST[0]) for _ in range(4)])
+    uniform.max_depth = 1
+    assert _enumerate_moves(uniform) == []
+
+    # Swapping a solid block with a subdivided block of the same colour
+    # changes no unit cell, in either engine
+    solid = Block(0, children=[
+        Block(1, COLOUR_LIST[0]),
+        Block(1, children=[Block(2, COLOUR_LIST[0]) for _ in range(4)]),
+        Block(1, COLOUR_LIST[1]), Block(1, COLOUR_LIST[1])])
+    solid.update_block_locations((0, 0), 80)
+    solid.max_depth = 2
+    for block in [solid] + solid.children + solid.children[1].children:
+        block.max_depth = 2
+    choices = [choice for block, choice in _enumerate_moves(solid)
+               if block is solid]
+    assert 2 not in choices
+    assert [choice for block, choice in
+            _enumerate_moves(linear_from_block(solid))
+            if block.level == 0] == choices
+
+    player = SmartPlayer(None, 0, BlobGoal(COLOUR_LIST[0]))
+    random.seed(3)
+    chosen = player._generate_moves(board)
+    assert len(chosen) == 5 and len(set(chosen)) == 5
+    player.difficulty = 5
+    assert sorted(player._generate_moves(board), key=moves.index) == moves
+
+
+def test_parallel_move_scores() -> None:
+    """Test that scoring a SmartPlayer's moves in worker processes gives the
+    same scores as scoring them one at a time.
+    """
+    import random
+    from block import generate_board
+    from player import SmartPlayer, close_pools, _score_move
+    board = generate_board(4, 320, random.Random(5))
+    for goal in [BlobGoal(COLOUR_LIST[1]), PerimeterGoal(COLOUR_LIST[2])]:
+        player = SmartPlayer(None, 0, goal)
+        player.difficulty = 5
+        player.workers = 3
+        moves = player._generate_moves(board)
+        before = board.board_hash()
+        assert player._score_moves_in_parallel(board, moves) == \
+            [_score_move(board, goal, move) for move in moves]
+        assert board.board_hash() == before
+    close_pools()
+
+
 def test_blob_goal():
     """Test the blob goal for the given board
     """
@@ -244,6 +537,197 @@ def test_blob_goal():
         assert goal.score(board) == score
 
 
+def test_blob_goal_large_board():
+    """Test the blob goal on a single-colour board of depth 10, whose one
+    blob is far too large to search recursively.
+    """
+    board = Block(0, COLOUR_LIST[2])
+    board.max_depth = 10
+    assert BlobGoal(COLOUR_LIST[2]).score(board) == 4 ** 10
+    assert BlobGoal(COLOUR_LIST[1]).score(board) == 0
+
+
+def test_perimeter_goal_large_board():
+    """Test the perimeter goal on a board of depth 12 with one subdivided
+    corner, which is scored without visiting its unit cells.
+    """
+    board = Block(0, children=[Block(1, COLOUR_LIST[0]),
+                               Block(1, COLOUR_LIST[0]),
+                               Block(1, COLOUR_LIST[0]),
+                               Block(1, children=[
+                                   Block(2, COLOUR_LIST[0]),
+                                   Block(2, COLOUR_LIST[0]),
+                                   Block(2, COLOUR_LIST[0]),
+                                   Block(2, COLOUR_LIST[1])])])
+    board.max_depth = 12
+    for block in board.children + board.children[3].children:
+        block.max_depth = 12
+    # The lower right corner is a block of COLOUR_LIST[1] that is 1024
+    # cells wide
+    assert PerimeterGoal(COLOUR_LIST[1]).score(board) == 2 * 1024
+    assert PerimeterGoal(COLOUR_LIST[0]).score(board) == 4 * 4096 - 2 * 1024
+
+
+def test_largest_blobs() -> None:
+    """Test that the blobs found over the undivided blocks of random boards
+    match those found over their unit cells.
+    """
+    import random
+    from block import generate_board
+    from goal import largest_blobs
+    for seed in range(20):
+        board = generate_board(5, 320, random.Random(seed))
+        grid = board.flatten()
+        expected = {}
+        seen = set()
+        for i in range(32):
+            for j in range(32):
+                if (i, j) in seen:
+                    continue
+                seen.add((i, j))
+                stack = [(i, j)]
+                size = 0
+                while stack:
+                    x, y = stack.pop()
+                    size += 1
+                    for near in ((x - 1, y), (x + 1, y), (x, y - 1),
+                                 (x, y + 1)):
+                        if near not in seen and 0 <= near[0] < 32 and \
+                                0 <= near[1] < 32 and \
+                                grid[near[0]][near[1]] == grid[i][j]:
+                            seen.add(near)
+                            stack.append(near)
+                expected[grid[i][j]] = max(expected.get(grid[i][j], 0), size)
+        assert largest_blobs(board) == expected
+
+
+def test_incremental_scoring() -> None:
+    """Test that goals which reuse their summaries across moves give the
+    same scores as fresh goals and as scoring the flattened board, and that
+    rotating a board reuses the summaries it already has.
+    """
+    import random
+    from block import generate_board
+    board = generate_board(5, 320, random.Random(11))
+    goals = [BlobGoal(colour) for colour in COLOUR_LIST] + \
+        [PerimeterGoal(colour) for colour in COLOUR_LIST]
+    rng = random.Random(12)
+    for _ in range(30):
+        block = board.get_selected_block((rng.randint(0, 320),
+                                          rng.randint(0, 320)),
+                                         rng.randint(0, 5))
+        action = rng.randint(1, 5)
+        if action <= 2:
+            block.swap(action - 1)
+        elif action <= 4:
+            block.rotate(2 * action - 5)
+        else:
+            block.smash()
+        linear = linear_from_block(board)
+        for goal in goals:
+            expected = type(goal)(goal.colour)
+            assert goal.score(board) == expected.score(board) == \
+                goal.score(linear)
+
+    # Only the root is new after one of its children is rotated, and
+    # nothing is new after the whole board is rotated.
+    blob_goals = goals[:len(COLOUR_LIST)]
+    counts = [len(goal._summaries) for goal in blob_goals]
+    board.children[2].rotate(3)
+    board.rotate(1)
+    for goal, count in zip(blob_goals, counts):
+        goal.score(board)
+        assert len(goal._summaries) <= count + 1
+
+
+def test_score_goals() -> None:
+    """Test that scoring many goals in one pass gives the same scores as
+    scoring each goal on its own.
+    """
+    import random
+    from block import generate_board
+    from goal import score_goals, colour_scores
+    goals = [BlobGoal(colour) for colour in COLOUR_LIST] + \
+        [PerimeterGoal(colour) for colour in COLOUR_LIST]
+    for seed in range(10):
+        board = generate_board(seed % 6, 320, random.Random(seed))
+        expected = [goal.score(board) for goal in goals]
+        assert score_goals(board, goals) == expected
+        assert score_goals(linear_from_block(board), goals) == expected
+        blob_scores, perimeter_scores = colour_scores(board)
+        assert [blob_scores[colour] for colour in COLOUR_LIST] + \
+            [perimeter_scores[colour] for colour in COLOUR_LIST] == expected
+
+
+def test_score_batch() -> None:
+    """Test that scoring a stack of boards at once gives the same scores as
+    scoring each board on its own.
+    """
+    import random
+    from block import generate_board
+    from goal import stack_boards
+    for max_depth in range(5):
+        boards = [generate_board(max_depth, 320, random.Random(seed))
+                  for seed in range(12)]
+        grids = stack_boards(boards[:6] +
+                             [board.flatten() for board in boards[6:]])
+        for colour in COLOUR_LIST:
+            for goal in [BlobGoal(colour), PerimeterGoal(colour)]:
+                assert list(goal.score_batch(grids)) == \
+                    [goal.score(board) for board in boards]
+
+
+def test_bitboard() -> None:
+    """Test that goals score a Bitboard the same as the board it views.
+    """
+    import random
+    from block import generate_board
+    from bitboard import Bitboard
+    for max_depth in range(7):
+        board = generate_board(max_depth, 320, random.Random(max_depth))
+        bitboard = Bitboard(board)
+        assert bitboard.size == 2 ** max_depth
+        assert Bitboard(linear_from_block(board)).colours == bitboard.colours
+        assert sum(bitboard.area(colour) for colour in COLOUR_LIST) == \
+            4 ** max_depth
+        for colour in COLOUR_LIST:
+            for goal in [BlobGoal(colour), PerimeterGoal(colour)]:
+                assert goal.score(bitboard) == goal.score(board)
+
+
+def test_colour_areas() -> None:
+    """Test that the colour counts of a board and its sub blocks match its
+    flattened form, and stay up to date as moves are made and undone.
+    """
+    import random
+    from block import generate_board
+
+    def check(block: Block) -> None:
+        flat = block.flatten()
+        assert block.colour_areas() == \
+            {colour: sum(column.count(colour) for column in flat)
+             for colour in COLOUR_LIST}
+        for child in block.children:
+            check(child)
+
+    random.seed(4)
+    board = generate_board(4, 320, random.Random(4))
+    check(board)
+    areas = board.colour_areas()
+    board.children[0].rotate(1)
+    board.children[2].swap(0)
+    assert board.colour_areas() == areas
+    for _ in range(5):
+        assert board.children[1].children[0].smash()
+        check(board)
+    for _ in range(5):
+        board.undo()
+    assert board.colour_areas() == areas
+    check(board)
+    assert board.colour_area(COLOUR_LIST[0]) == areas[COLOUR_LIST[0]]
+    assert board.colour_area((1, 2, 3)) == 0
+
+
 def test_perimeter_goal():
     """
     Test the blob goal for the given board
@@ -285,6 +769,347 @@ def test_smart_player_game():
     game.run_game(3)
 
 
+def test_flatten_cache() -> None:
+    """Test that flatten reuses cached results until the board changes.
+
+    - Flattening an unchanged board is answered from the cache
+    - After each kind of move the result matches a freshly built board
+    """
+    import random
+    from block import random_init, reset_flatten_counters
+    from board_io import dump, load
+    random.seed(148)
+    board = random_init(0, 4)
+    board.update_block_locations((0, 0), 160)
+    reset_flatten_counters()
+    first = board.flatten()
+    assert board.flatten() is first
+    assert Block.flatten_hits == 1
+
+    moves = [((100, 20), 1, 'rotate', 1), ((5, 150), 2, 'swap', 0),
+             ((70, 70), 0, 'rotate', 3), ((130, 130), 1, 'swap', 1),
+             ((30, 30), 1, 'smash', None)]
+    for _ in make_moves([board], moves):
+        assert board.flatten() == load(dump(board)).flatten()
+    assert Block.flatten_hits > 1
+
+
+def test_set_colour() -> None:
+    """Test that setting the colour of a block brings the cached results of
+    it and its ancestors up to date.
+    """
+    import random
+    from block import generate_board
+    board = generate_board(2, 160, random.Random(2))
+    board.update_block_locations((0, 0), 160)
+    leaf = board.get_selected_block((10, 10), 2)
+    board.flatten()
+    old_hash = board.board_hash()
+    board.colour_areas()
+    new_colour = COLOUR_LIST[(COLOUR_LIST.index(leaf.colour) + 1) % 4]
+    leaf.colour = new_colour
+    assert board.flatten()[0][0] == new_colour
+    assert board.board_hash() != old_hash
+    assert board.colour_areas() == \
+        {colour: sum(column.count(colour) for column in board.flatten())
+         for colour in COLOUR_LIST}
+    expected = linear_from_block(board)
+    expected.update_block_locations((0, 0), 160)
+    assert BlobGoal(new_colour).score(board) == \
+        BlobGoal(new_colour).score(expected)
+    assert sorted(board.rectangles_to_draw()) == \
+        sorted(expected.rectangles_to_draw())
+
+
+def test_generate_board() -> None:
+    """Test the level-by-level board generator.
+
+    - The same seed gives the same board, for both kinds of generator
+    - Deep boards can be generated, with their locations already set
+    """
+    import random
+    import numpy
+    from block import generate_board
+    for make_rng in [random.Random, numpy.random.default_rng]:
+        first = generate_board(4, 160, make_rng(7))
+        second = generate_board(4, 160, make_rng(7))
+        assert equal_boards(first, second)
+        assert first.flatten() == second.flatten()
+
+    board = generate_board(11, 2048, random.Random(3))
+    assert board.size == 2048
+    leaf = board.get_selected_block((1000, 1000), 11)
+    assert leaf.size == 2 ** (11 - leaf.level)
+    assert leaf.level <= 11 and len(leaf.children) == 0
+
+
+def test_board_hash() -> None:
+    """Test that board hashes match exactly when boards have the same
+    structure and colours, including after moves.
+    """
+    import random
+    from block import generate_board
+    board, _ = construct_board()
+    copy, _ = construct_board()
+    assert board.board_hash() == copy.board_hash()
+    board.swap(0)
+    assert board.board_hash() != copy.board_hash()
+    board.swap(0)
+    assert board.board_hash() == copy.board_hash()
+
+    board = generate_board(6, 640, random.Random(5))
+    copy = generate_board(6, 640, random.Random(5))
+    linear = linear_from_block(copy)
+    moves = [((600, 30), 1, 'rotate', 1), ((30, 500), 2, 'swap', 0),
+             ((320, 320), 0, 'rotate', 3), ((400, 90), 3, 'swap', 1),
+             ((320, 320), 0, 'rotate', 1), ((100, 600), 2, 'rotate', 3)]
+    board.board_hash()
+    for _ in make_moves([board, linear], moves):
+        # Rebuild the board from scratch and compare hashes
+        rebuilt = Block(0)
+        rebuilt.max_depth = 6
+        stack = [(rebuilt, linear)]
+        while stack:
+            block, view = stack.pop()
+            block.max_depth = 6
+            if view.colour:
+                block.colour = view.colour
+            else:
+                block.children = [Block(block.level + 1) for _ in range(4)]
+                stack.extend(zip(block.children, view.children))
+        assert board.board_hash() == rebuilt.board_hash()
+        assert board.flatten() == rebuilt.flatten()
+        board.board_hash()
+
+
+def test_hash_other_colours() -> None:
+    """Test that blocks with colours outside COLOUR_LIST can be hashed and
+    scored.
+    """
+    other = (1, 2, 3)
+    leaf = Block(0, other)
+    assert leaf.board_hash() != Block(0, COLOUR_LIST[0]).board_hash()
+    assert BlobGoal(other).score(leaf) == 1
+    board = Block(0, children=[Block(1, other), Block(1, other),
+                               Block(1, COLOUR_LIST[0]), Block(1, other)])
+    board.max_depth = 1
+    for child in board.children:
+        child.max_depth = 1
+    assert BlobGoal(other).score(board) == 3
+    assert PerimeterGoal(other).score(board) == 6
+
+
+def test_persistent_block() -> None:
+    """Test that moves on a PersistentBlock give the same boards as on a
+    Block, without changing earlier snapshots.
+    """
+    import random
+    from block import generate_board
+    from persistent_block import freeze
+    board = generate_board(5, 320, random.Random(11))
+    snapshot = freeze(board)
+    original = snapshot.flatten()
+
+    current = snapshot
+    moves = [((300, 30), 1, 'rotate', 1), ((30, 200), 2, 'swap', 0),
+             ((150, 150), 0, 'rotate', 3), ((200, 250), 3, 'swap', 1),
+             ((60, 60), 2, 'smash', None), ((250, 100), 0, 'swap', 1)]
+    for [block], (location, level, action, direction) in \
+            make_moves([board], moves):
+        path = current.path_at(location, level, (0, 0), 320)
+        assert current.get_block(path).level == block.level
+        if action == 'smash':
+            following = current.smash(path)
+        else:
+            following = getattr(current, action)(path, direction)
+        assert following.flatten() == board.flatten()
+        if path:
+            # Blocks off the path are shared with the previous board
+            sibling = (path[0] + 1) % 4
+            assert following.children[sibling]._children is \
+                current.children[sibling]._children
+        current = following
+
+    assert snapshot.flatten() == original
+    assert current.to_block().flatten() == board.flatten()
+
+
+def test_dump_and_load(tmp_path) -> None:
+    """Test saving boards in the binary format and loading them again,
+    one at a time and from a corpus file.
+    """
+    import random
+    from block import generate_board
+    from board_io import dump, load, write_corpus, BoardCorpus
+    board, flatten_expected = construct_board()
+    # 9 blocks, 7 of which are undivided: 9 + 2 * 7 bits fit in 3 bytes
+    data = dump(board)
+    assert len(data) == 6 + 3
+    loaded = load(data)
+    assert equal_boards(loaded, board)
+    assert loaded.flatten() == flatten_expected
+
+    boards = [generate_board(6, 0, random.Random(seed)) for seed in range(20)]
+    path = str(tmp_path / 'boards.bin')
+    assert write_corpus(path, boards) == 20
+    with BoardCorpus(path) as corpus:
+        assert len(corpus) == 20
+        assert equal_boards(corpus[7], boards[7])
+        for original, copy in zip(boards, corpus):
+            assert copy.flatten() == original.flatten()
+
+    # A record that subdivides a block at the maximum depth is malformed,
+    # and a corpus whose last header is cut off is refused
+    from board_io import RECORD_HEADER
+    for data in [RECORD_HEADER.pack(0, 0, 13) + bytes([0x80, 0]),
+                 RECORD_HEADER.pack(0, 1, 13)]:
+        try:
+            load(data)
+        except ValueError:
+            pass
+        else:
+            assert False, 'loaded a bad record'
+    with open(path, 'ab') as corpus_file:
+        corpus_file.write(RECORD_HEADER.pack(0, 1, 13)[:3])
+    try:
+        BoardCorpus(path)
+    except ValueError:
+        pass
+    else:
+        assert False, 'opened a truncated corpus'
+
+
+def test_lazy_rotation() -> None:
+    """Test that rotating a block only records the rotation, and that the
+    board then looks exactly as if its descendants had been rotated.
+    """
+    import random
+    from block import random_init
+    random.seed(148)
+    board = random_init(0, 6)
+    board.update_block_locations((0, 0), 640)
+    linear = linear_from_block(board)
+    grandchild = board.children[1].children[2]
+    board.flatten()
+    board.flatten_array()
+
+    board.rotate(1)
+    linear.rotate(1)
+    assert grandchild._orientation == 0
+    assert board.flatten() == linear.flatten()
+    assert (board.flatten_array() == linear.flatten_array()).all()
+
+    for location, level, direction in [((600, 30), 1, 3), ((30, 500), 2, 1),
+                                       ((320, 320), 0, 3), ((400, 90), 3, 1)]:
+        board.get_selected_block(location, level).rotate(direction)
+        linear.get_selected_block(location, level).rotate(direction)
+        assert board.flatten() == linear.flatten()
+        assert (board.flatten_array() == linear.flatten_array()).all()
+        assert set(board.rectangles_to_draw()) == \
+            set(linear.rectangles_to_draw())
+
+    # Move a block while a rotation of its parent is still pending
+    child = [grandchild for child in board.children
+             for grandchild in child.children if grandchild.children][0]
+    location = child.position
+    parent = child.parent
+    parent.rotate(1)
+    board.flatten()
+    parent.rotate(3)
+    child.swap(0)
+    child.rotate(1)
+    view = linear.get_selected_block(location, 2)
+    view.swap(0)
+    view.rotate(1)
+    assert board.flatten() == linear.flatten()
+
+
+def test_lazy_locations() -> None:
+    """Test that block positions and sizes stay consistent with their
+    parents after moves, without another call to update_block_locations.
+    """
+    import random
+    from block import random_init
+    random.seed(148)
+    board = random_init(0, 5)
+    board.update_block_locations((10, 20), 320)
+    moves = [((300, 30), 1, 'rotate', 1), ((30, 200), 2, 'swap', 0),
+             ((150, 150), 0, 'rotate', 3), ((200, 250), 3, 'swap', 1),
+             ((60, 60), 2, 'smash', None)]
+    for _ in make_moves([board], moves):
+        # Check every block against the layout described in Block
+        stack = [(board, (10, 20), 320)]
+        while stack:
+            block, (x, y), size = stack.pop()
+            assert block.position == (x, y) and block.size == size
+            half = round(size / 2)
+            stack.extend(zip(block.children,
+                             [(x + half, y), (x, y), (x, y + half),
+                              (x + half, y + half)],
+                             [half] * 4))
+
+
+def test_flatten_array() -> None:
+    """Test that flatten_array gives the colour indices of flatten, also
+    after the board changes.
+    """
+    import random
+    from block import random_init
+    board, flatten_expected = construct_board()
+    expected = [[COLOUR_LIST.index(colour) for colour in column]
+                for column in flatten_expected]
+    assert board.flatten_array().dtype.name == 'uint8'
+    assert board.flatten_array().tolist() == expected
+
+    random.seed(148)
+    board = random_init(0, 5)
+    board.update_block_locations((0, 0), 320)
+    for location, level in [((300, 10), 1), ((20, 200), 2), ((150, 150), 3)]:
+        block = board.get_selected_block(location, level)
+        block.rotate(1)
+        block.swap(0)
+        block.smash()
+        grid = board.flatten_array()
+        assert grid.shape == (32, 32)
+        assert grid.tolist() == [[COLOUR_LIST.index(colour)
+                                  for colour in column]
+                                 for column in board.flatten()]
+
+
+def test_linear_engine_matches_block():
+    """Test that the linear quadtree engine behaves like the Block engine.
+
+    - Boards generated from the same seed are identical
+    - The same sequence of moves leaves both boards identical
+    """
+    import random
+    from block import random_init
+    random.seed(148)
+    board = random_init(0, 4)
+    board.update_block_locations((0, 0), 160)
+    random.seed(148)
+    linear = linear_random_init(4)
+    linear.update_block_locations((0, 0), 160)
+
+    assert linear.flatten() == board.flatten()
+    assert set(linear.rectangles_to_draw()) == \
+        set(board.rectangles_to_draw())
+
+    moves = [((100, 20), 1, 'rotate', 1), ((5, 150), 2, 'swap', 0),
+             ((70, 70), 0, 'rotate', 3), ((130, 130), 1, 'swap', 1),
+             ((30, 30), 1, 'smash', None), ((90, 10), 2, 'smash', None)]
+    for [block, view], _ in make_moves([board, linear], moves):
+        assert (view.position, view.size, view.level) == \
+            (block.position, block.size, block.level)
+        assert linear.flatten() == board.flatten()
+
+    converted = linear_from_block(board)
+    assert converted.flatten() == board.flatten()
+    assert (converted.flatten_array() == board.flatten_array()).all()
+    assert set(converted.rectangles_to_draw()) == \
+        set(board.rectangles_to_draw())
+
+
 ###############################################################################
 # Test helpers
 ###############################################################################
@@ -303,6 +1128,32 @@ def equal_boards(b1: Block, b2: Block) -> bool:
         return True
 
 
+def make_moves(boards: list, moves: List[tuple]) -> Iterator[tuple]:
+    """Make each of <moves> on every board in <boards>, yielding the blocks
+    it was made on, in the same order as <boards>, and the move itself.
+
+    Each move is a tuple (location, level, action, direction), where
+    <action> is 'swap', 'rotate' or 'smash' and <direction> is None for a
+    smash.  The boards may be Blocks or LinearBlocks.  Every board is
+    smashed from the same random state, and that state is restored after
+    each move, so that the smash can be repeated on yet another board.
+    """
+    import random
+    for move in moves:
+        location, level, action, direction = move
+        blocks = [board.get_selected_block(location, level)
+                  for board in boards]
+        state = random.getstate()
+        for block in blocks:
+            random.setstate(state)
+            if action == 'smash':
+                block.smash()
+            else:
+                getattr(block, action)(direction)
+        random.setstate(state)
+        yield blocks, move
+
+
 def construct_board() -> Tuple[Block, List[List[Tuple[int, int, int]]]]:
     """Return a fixed board and its flattened representation.
     """